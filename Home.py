@@ -12,6 +12,7 @@ This tool allows you to simulate and compare different **business scenarios** us
 Use the sidebar to:
 - ▶️ **Create or Edit Scenarios**: Define input parameters such as fees, CAPEX, OPEX, growth rates.
 - 📈 **Compare Scenarios**: View financial projections (NPV, ROI, Break-even) and visual comparisons.
+- 🧪 **Design Study**: Evaluate large sets of scenario variations in the background.
 
 ---
 
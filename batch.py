@@ -0,0 +1,389 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+from calculations import expand_schedule
+from models import TEAConfig
+
+
+@dataclass
+class BatchInputs:
+    """
+    Column-oriented inputs for `evaluate_batch`, one row per scenario.
+
+    Values are in config units (growth and discount rates in %). Scalar inputs have shape
+    `(n,)`. Per-year inputs are always stored as full schedules so that scalar and
+    scheduled configs go through the same vectorized code: fees and CAPEX have shape
+    `(n, T)` and growth rates `(n, T - 1)`, where `T` is the longest horizon in the batch.
+    Values past a scenario's own `years` are ignored.
+    """
+    starting_subscribers: np.ndarray
+    subscriber_growth_rate: np.ndarray
+    opex_growth_rate: np.ndarray
+    discount_rate: np.ndarray
+    subscription_fee: np.ndarray
+    pay_per_use_fee: np.ndarray
+    base_opex: np.ndarray
+    capex: np.ndarray
+    years: np.ndarray
+    subscription_ratio: np.ndarray
+    names: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.years)
+
+    @property
+    def horizon(self) -> int:
+        return self.subscription_fee.shape[1]
+
+    @staticmethod
+    def from_arrays(names: Optional[List[str]] = None, **columns) -> "BatchInputs":
+        """
+        Build a batch from per-field arrays.
+
+        Scalar fields take shape `(n,)`. Schedule fields take either `(n,)`, meaning a
+        constant value (CAPEX: a one-time Year 0 amount), or an already expanded
+        `(n, T)` / `(n, T - 1)` schedule.
+        """
+        years = np.asarray(columns["years"], dtype=int)
+        n, horizon = len(years), int(years.max(initial=1))
+
+        def schedule(key, length, one_time=False):
+            values = np.asarray(columns[key], dtype=float)
+            if values.ndim == 2:
+                return values[:, :length]
+            if one_time:
+                expanded = np.zeros((n, length))
+                expanded[:, 0] = values
+                return expanded
+            return np.repeat(values[:, None], length, axis=1)
+
+        return BatchInputs(
+            starting_subscribers=np.asarray(columns["starting_subscribers"], dtype=float),
+            subscriber_growth_rate=schedule("subscriber_growth_rate", horizon - 1),
+            opex_growth_rate=schedule("opex_growth_rate", horizon - 1),
+            discount_rate=np.asarray(columns["discount_rate"], dtype=float),
+            subscription_fee=schedule("subscription_fee", horizon),
+            pay_per_use_fee=schedule("pay_per_use_fee", horizon),
+            base_opex=np.asarray(columns["base_opex"], dtype=float),
+            capex=schedule("capex", horizon, one_time=True),
+            years=years,
+            subscription_ratio=np.broadcast_to(
+                np.asarray(columns.get("subscription_ratio", 1.0), dtype=float), (n,)
+            ).copy(),
+            names=names,
+        )
+
+    @staticmethod
+    def from_configs(configs: Sequence[TEAConfig]) -> "BatchInputs":
+        horizon = max(c.financials.years for c in configs)
+
+        def schedules(values, fill=None, growth=False):
+            length = horizon - 1 if growth else horizon
+            return np.array([expand_schedule(v, length, fill) for v in values]).reshape(len(configs), length)
+
+        scn = [c.scenario for c in configs]
+        fin = [c.financials for c in configs]
+        return BatchInputs(
+            starting_subscribers=np.array([f.starting_subscribers for f in fin], dtype=float),
+            subscriber_growth_rate=schedules([s.subscriber_growth_rate for s in scn], growth=True),
+            opex_growth_rate=schedules([s.opex_growth_rate for s in scn], growth=True),
+            discount_rate=np.array([s.discount_rate for s in scn], dtype=float),
+            subscription_fee=schedules([f.subscription_fee for f in fin]),
+            pay_per_use_fee=schedules([f.pay_per_use_fee for f in fin]),
+            base_opex=np.array([f.base_opex for f in fin], dtype=float),
+            capex=schedules([f.capex for f in fin], fill=0.0),
+            years=np.array([f.years for f in fin], dtype=int),
+            subscription_ratio=np.array([f.subscription_ratio for f in fin], dtype=float),
+            names=[s.name for s in scn],
+        )
+
+
+def _grow(start: np.ndarray, growth_pct: np.ndarray) -> np.ndarray:
+    # Same multiplication order as the year-by-year loop, so results match it exactly.
+    steps = np.concatenate([start[:, None], 1 + growth_pct / 100], axis=1)
+    return np.multiply.accumulate(steps, axis=1)
+
+
+def _grow_closed_form(start: np.ndarray, growth_pct: np.ndarray) -> np.ndarray:
+    # path_t = start * exp(sum of log growth factors): every year independently, no running product.
+    n = growth_pct.shape[0]
+    log_steps = np.concatenate([np.zeros((n, 1)), np.log1p(growth_pct / 100)], axis=1)
+    return start[:, None] * np.exp(np.cumsum(log_steps, axis=1))
+
+
+def _growth_sensitivity(growth_pct: np.ndarray) -> np.ndarray:
+    # d ln(path_t) / d(growth in % points), for a shift of every year's growth rate.
+    n = growth_pct.shape[0]
+    steps = np.concatenate([np.zeros((n, 1)), 1 / (100 + growth_pct)], axis=1)
+    return np.cumsum(steps, axis=1)
+
+
+def _distinct_rows(key: np.ndarray):
+    """
+    Indices `(first, inverse)` with `key[first][inverse] == key`, one `first` entry per
+    distinct row of the `(n, k)` array `key`.
+    """
+    if (key == key[0]).all():
+        return np.zeros(1, dtype=int), np.zeros(len(key), dtype=int)
+    # Sorting a 1-D fingerprint is much cheaper than sorting whole rows; identical rows
+    # always get identical fingerprints, and a collision is caught by the exact check.
+    weights = np.random.default_rng(key.shape[1]).uniform(1, 2, key.shape[1])
+    _, first, inverse = np.unique(key @ weights, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    if not np.array_equal(key[first][inverse], key):
+        rows = np.ascontiguousarray(key).view(np.dtype((np.void, key.itemsize * key.shape[1]))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    return first, inverse
+
+
+def _estimate_distinct(key: np.ndarray, sample: int) -> float:
+    """
+    Estimated number of distinct rows of `key` from a random sample of `sample` rows.
+
+    If the batch held D equally common rows, a sample of s rows would contain about
+    D * (1 - exp(-s / D)) distinct ones; this solves that for D given the observed count.
+    """
+    n = len(key)
+    rows = np.random.default_rng(0).choice(n, size=sample, replace=False)
+    seen = len(_distinct_rows(key[rows])[0])
+    low, high = float(seen), float(n)
+    if high * -np.expm1(-sample / high) <= seen:
+        return high
+    for _ in range(64):
+        mid = np.sqrt(low * high)
+        if mid * -np.expm1(-sample / mid) < seen:
+            low = mid
+        else:
+            high = mid
+    return high
+
+
+class _Shared:
+    """
+    Computes an intermediate once per distinct combination of its inputs and broadcasts
+    it to every scenario that uses it. `distinct` is the number of rows actually computed;
+    `paths` is the number of distinct input rows, estimated if the exact search was
+    skipped, or None if it was not looked for.
+    """
+
+    # Rows sampled to estimate the distinct count before paying for an exact search.
+    SAMPLE = 4096
+
+    def __init__(self, *columns: np.ndarray, dedup: bool = True):
+        n = len(columns[0])
+        self.columns = columns
+        self.n = self.distinct = n
+        self.paths = None
+        self.first = self.inverse = None
+        if n < 2:
+            self.paths = n
+            return
+        # A single shared row is a read-only broadcast and costs nothing, so it is always used.
+        if all((np.asarray(c) == np.asarray(c)[0]).all() for c in columns):
+            self.first, self.inverse = np.zeros(1, dtype=int), None
+            self.distinct = self.paths = 1
+            return
+        if not dedup:
+            return
+        key = np.column_stack([np.asarray(c, dtype=float).reshape(n, -1) for c in columns])
+        if n > 2 * self.SAMPLE:
+            estimate = _estimate_distinct(key, self.SAMPLE)
+            if 2 * estimate > n:
+                self.paths = int(round(estimate))
+                return
+        first, inverse = _distinct_rows(key)
+        self.paths = len(first)
+        # Gathering shared rows back out costs about as much as computing them, so only
+        # share when it removes at least half of the work.
+        if 2 * len(first) <= n:
+            self.first, self.inverse, self.distinct = first, inverse, len(first)
+
+    def __call__(self, fn) -> np.ndarray:
+        # `fn(*columns)` must compute each row independently of the others.
+        if self.first is None:
+            return fn(*self.columns)
+        shared = fn(*(c[self.first] for c in self.columns))
+        if self.distinct == 1:
+            return np.broadcast_to(shared, (self.n,) + shared.shape[1:])
+        return shared.take(self.inverse, axis=0)
+
+
+def evaluate_batch(
+    inputs: BatchInputs, gradients: bool = False, method: str = "product", dedup: bool = False
+) -> Dict[str, np.ndarray]:
+    """
+    Evaluate every scenario in `inputs` at once.
+
+    Returns per-year series of shape `(n, T)` (NaN past each scenario's horizon) and
+    per-scenario metrics of shape `(n,)`, keyed like the results on the Compare page.
+    With `gradients=True` the result also holds analytic partial derivatives (see
+    `_gradients`), computed from the same intermediates as the forward pass.
+
+    `method="product"` compounds growth year by year like `TEACalculator`;
+    `method="closed_form"` computes each year's growth factor directly in log space.
+
+    Subscriber and OPEX projections that are the same for every scenario (one growth
+    path, as in a fee, ratio or CAPEX sweep) are computed once and shared as a read-only
+    row; so are discount factors for a single rate. With `dedup=True` projections are
+    also computed once per distinct growth path (start value and growth schedule) when
+    there are several. Those shared rows are gathered back per scenario, which costs
+    about as much as the projection it saves, so that is off by default.
+    `results["dedup"]` reports the distinct paths found (estimated for large batches with
+    few repeats, None if not searched) and how many projections were computed.
+    """
+    horizon = inputs.horizon
+    in_horizon = np.arange(horizon) < inputs.years[:, None]
+
+    if method == "product":
+        grow = _grow
+    elif method == "closed_form":
+        grow = _grow_closed_form
+    else:
+        raise ValueError(f"Unknown evaluation method '{method}'")
+
+    # Horizons only mask the projections, so paths are shared across different `years`.
+    subscriber_paths = _Shared(inputs.starting_subscribers.astype(float), inputs.subscriber_growth_rate, dedup=dedup)
+    opex_paths = _Shared(inputs.base_opex.astype(float), inputs.opex_growth_rate, dedup=dedup)
+
+    def project_subscribers(start, growth_pct):
+        path = grow(start, growth_pct)
+        if method == "closed_form":
+            # Undo last-bit drift from exp/log before truncating to whole subscribers.
+            nearest = np.round(path)
+            path = np.where(np.abs(path - nearest) <= 1e-9 * np.abs(nearest), nearest, path)
+        return path
+
+    subscriber_path = subscriber_paths(project_subscribers)
+    subscribers = np.trunc(subscriber_path)
+    opex = opex_paths(grow)
+
+    r_sub = inputs.subscription_ratio[:, None]
+    subscription_revenue = (subscribers * r_sub) * inputs.subscription_fee
+    pay_per_use_revenue = (subscribers * (1 - r_sub)) * inputs.pay_per_use_fee
+    revenue = subscription_revenue + pay_per_use_revenue
+
+    profit = np.where(in_horizon, revenue - opex, 0.0)
+    capex = np.where(in_horizon, inputs.capex, 0.0)
+    cum_cash_flow = np.cumsum(profit - capex, axis=1)
+
+    discount = _Shared(inputs.discount_rate, dedup=dedup)(lambda rate: (1 + rate[:, None] / 100) ** np.arange(1, horizon + 1))
+    npv = (profit / discount).sum(axis=1)
+
+    total_capex = capex.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roi = np.where(total_capex > 0, (profit.sum(axis=1) - total_capex) / total_capex, np.inf)
+
+    reached = (cum_cash_flow >= 0) & in_horizon
+    breakeven_year = np.where(reached.any(axis=1), reached.argmax(axis=1) + 1, -1)
+
+    def series(values):
+        return np.where(in_horizon, values, np.nan)
+
+    results = {
+        "subscribers": series(subscribers),
+        "subscription_revenue": series(subscription_revenue),
+        "pay_per_use_revenue": series(pay_per_use_revenue),
+        "revenues": series(revenue),
+        "opex": series(opex),
+        "capex": series(capex),
+        "profit": series(profit),
+        "cum_cash_flow": series(cum_cash_flow),
+        "reverse_fee": series(opex / np.maximum(subscribers, 1)),
+        "npv": npv,
+        "roi": roi,
+        "breakeven_year": breakeven_year,
+        "dedup": {
+            "scenarios": len(inputs),
+            "subscriber_paths": subscriber_paths.paths,
+            "opex_paths": opex_paths.paths,
+            "projections": subscriber_paths.distinct + opex_paths.distinct,
+            # Projections needed without sharing per projection actually computed.
+            "ratio": 2 * len(inputs) / max(subscriber_paths.distinct + opex_paths.distinct, 1),
+        },
+    }
+    if gradients:
+        results["gradients"] = _gradients(
+            inputs, in_horizon, subscriber_path, subscribers, opex, profit, discount, series, subscriber_paths, opex_paths
+        )
+    return results
+
+
+GRADIENT_INPUTS = (
+    "starting_subscribers",
+    "subscriber_growth_rate",
+    "opex_growth_rate",
+    "discount_rate",
+    "subscription_fee",
+    "pay_per_use_fee",
+    "base_opex",
+    "capex",
+    "subscription_ratio",
+)
+
+
+def _gradients(
+    inputs, in_horizon, subscriber_path, subscribers, opex, profit, discount, series, subscriber_paths, opex_paths
+):
+    """
+    Hand-derived partial derivatives of NPV, cumulative cash flow and the reverse-pricing
+    fee with respect to every input in `GRADIENT_INPUTS`.
+
+    Derivatives are per config unit: per subscriber, per € and per percentage point.
+    Schedule inputs (growth rates, fees) are shifted uniformly across all years, and
+    `capex` means the up-front amount. Whole-subscriber rounding is treated as the
+    continuous projection, since its true derivative is zero almost everywhere.
+    """
+    r_sub = inputs.subscription_ratio[:, None]
+    fee = r_sub * inputs.subscription_fee + (1 - r_sub) * inputs.pay_per_use_fee
+    def unit_path(start, growth_pct):
+        return _grow(np.ones(len(start)), growth_pct)
+
+    def sensitivity(start, growth_pct):
+        return _growth_sensitivity(growth_pct)
+
+    d_subs = {
+        "starting_subscribers": subscriber_paths(unit_path),
+        "subscriber_growth_rate": subscriber_path * subscriber_paths(sensitivity),
+    }
+    d_opex = {
+        "base_opex": opex_paths(unit_path),
+        "opex_growth_rate": opex * opex_paths(sensitivity),
+    }
+
+    zeros = np.zeros_like(profit)
+    d_revenue = {
+        "starting_subscribers": fee * d_subs["starting_subscribers"],
+        "subscriber_growth_rate": fee * d_subs["subscriber_growth_rate"],
+        "subscription_fee": subscribers * r_sub,
+        "pay_per_use_fee": subscribers * (1 - r_sub),
+        "subscription_ratio": subscribers * (inputs.subscription_fee - inputs.pay_per_use_fee),
+    }
+    d_profit = {name: np.where(in_horizon, d_revenue[name], 0.0) for name in d_revenue}
+    d_profit.update({name: np.where(in_horizon, -d_opex[name], 0.0) for name in d_opex})
+
+    # Inputs an output does not depend on share one read-only zero array.
+    zero_series = series(zeros)
+    zero_series.flags.writeable = False
+    zero_metric = np.zeros(len(inputs))
+    zero_metric.flags.writeable = False
+
+    years = np.arange(1, profit.shape[1] + 1)
+    npv = {name: (d_profit[name] / discount).sum(axis=1) if name in d_profit else zero_metric for name in GRADIENT_INPUTS}
+    npv["discount_rate"] = -(years * profit / (discount * (100 + inputs.discount_rate[:, None]))).sum(axis=1)
+
+    cum_cash_flow = {
+        name: series(np.cumsum(d_profit[name], axis=1)) if name in d_profit else zero_series for name in GRADIENT_INPUTS
+    }
+    cum_cash_flow["capex"] = series(np.full_like(profit, -1.0))
+
+    # reverse fee = opex / max(subscribers, 1)
+    divisor = np.maximum(subscribers, 1)
+    reverse_fee = {name: zero_series for name in GRADIENT_INPUTS}
+    for name, d in d_opex.items():
+        reverse_fee[name] = series(d / divisor)
+    for name, d in d_subs.items():
+        reverse_fee[name] = series(np.where(subscribers > 1, -opex * d / divisor ** 2, 0.0))
+
+    return {"npv": npv, "cum_cash_flow": cum_cash_flow, "reverse_fee": reverse_fee}
@@ -0,0 +1,177 @@
+"""
+Adaptive search for outcome boundaries in parameter space.
+
+Decisions mostly hinge on where an outcome flips: where NPV crosses zero, or where
+break-even moves from year k to k + 1. `find_boundary` locates these contours over
+2-3 input fields. It uses quadtree (2-D) or octree (3-D) refinement: start from a
+coarse grid of cells, evaluate cell corners, and split only the cells whose corners
+disagree. Refinement stops once cells are as small as the requested tolerance.
+Evaluations then grow with the size of the boundary, not with the volume of the box.
+
+Corners are evaluated with `evaluate_batch`, which matches `TEACalculator` exactly,
+one batch per refinement level. Features smaller than a cell of the initial grid
+(e.g. a region that appears and disappears between two corners) can be missed;
+raise `initial` for such inputs.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from batch import evaluate_batch
+from bundles import NUMERIC_FIELDS
+from models import TEAConfig
+from sweep import grid_batch
+
+TARGETS = ("npv", "breakeven_year")
+
+
+@dataclass
+class Boundary:
+    """
+    Points on the boundary surface, in field units.
+
+    Each point lies on a leaf cell edge whose ends are on opposite sides of the boundary.
+    The true crossing on that edge is within `tolerance` (one leaf cell width per field).
+    For `breakeven_year`, `labels` holds k for a k -> k + 1 crossing, where k + 1 past
+    the `horizon` means break-even is never reached. NPV crossings are labelled 0.
+    """
+    fields: List[str]
+    target: str
+    level: float
+    horizon: int
+    points: np.ndarray
+    labels: np.ndarray
+    tolerance: Dict[str, float]
+    evaluations: int
+    grid_evaluations: int
+
+    def by_label(self) -> Dict[str, np.ndarray]:
+        """Boundary points grouped into readable contour names, e.g. for `plots.plot_boundary`."""
+        if self.target == "npv":
+            return {f"NPV = {self.level:,.0f} €": self.points}
+        return {
+            f"Break-even year {k} → {k + 1 if k < self.horizon else 'not reached'}": self.points[self.labels == k]
+            for k in np.unique(self.labels).tolist()
+        }
+
+
+def _classes(target: str, results: Dict[str, np.ndarray], level: float, horizon: np.ndarray) -> np.ndarray:
+    if target == "npv":
+        return (results["npv"] >= level).astype(np.int64)
+    # Order break-even years so that "never" comes after the last year.
+    year = results["breakeven_year"]
+    return np.where(year == -1, horizon + 1, year)
+
+
+def find_boundary(base: TEAConfig,
+                  bounds: Dict[str, Tuple[float, float]],
+                  target: str = "npv",
+                  level: float = 0.0,
+                  tolerance: float = 0.01,
+                  initial: int = 8) -> Boundary:
+    """
+    Find where `target` changes over the box `bounds` (`{field: (low, high)}`, 2-3 fields).
+
+    `target="npv"` traces the contour `npv == level` and `"breakeven_year"` the contours
+    between consecutive break-even years. All other inputs come from `base`. `tolerance`
+    is the leaf cell width as a fraction of each field's range; `initial` is the number
+    of cells per field in the starting grid.
+    """
+    if target not in TARGETS:
+        raise ValueError(f"Unknown boundary target '{target}' (expected one of {', '.join(TARGETS)})")
+    fields = list(bounds)
+    dims = len(fields)
+    if dims not in (2, 3):
+        raise ValueError("Boundaries are searched over 2 or 3 fields")
+    for name in fields:
+        if name not in NUMERIC_FIELDS or name == "years":
+            raise ValueError(f"'{name}' is not a continuous input field")
+    if not 0 < tolerance < 1:
+        raise ValueError("tolerance must be a fraction of the range, between 0 and 1")
+    low = np.array([bounds[f][0] for f in fields], dtype=float)
+    high = np.array([bounds[f][1] for f in fields], dtype=float)
+    if not (high > low).all():
+        raise ValueError("Each range needs low < high")
+
+    # Corners live on an integer lattice with `resolution` steps per field; a leaf cell
+    # spans one step, a cell at refinement level l spans 2^(depth - l) steps.
+    depth = max(int(np.ceil(np.log2(1 / (initial * tolerance)))), 0)
+    resolution = initial << depth
+    horizon = np.array([base.financials.years])
+    offsets = (np.arange(2 ** dims)[:, None] >> np.arange(dims)) & 1
+
+    def encode(lattice):
+        return np.ravel_multi_index(tuple(lattice.reshape(-1, dims).T), (resolution + 1,) * dims)
+
+    known_codes = np.zeros(0, dtype=np.int64)
+    known_classes = np.zeros(0, dtype=np.int64)
+    known_npv = np.zeros(0)
+
+    def lookup(codes):
+        # Evaluate lattice points that have not been seen yet, then read all of them back.
+        nonlocal known_codes, known_classes, known_npv
+        new = np.setdiff1d(codes, known_codes)
+        if len(new):
+            lattice = np.stack(np.unravel_index(new, (resolution + 1,) * dims), axis=1)
+            values = low + lattice / resolution * (high - low)
+            results = evaluate_batch(grid_batch(base, {f: values[:, j] for j, f in enumerate(fields)}))
+            order = np.argsort(np.concatenate([known_codes, new]), kind="stable")
+            known_codes = np.concatenate([known_codes, new])[order]
+            known_classes = np.concatenate([known_classes, _classes(target, results, level, horizon)])[order]
+            known_npv = np.concatenate([known_npv, results["npv"]])[order]
+        at = np.searchsorted(known_codes, codes)
+        return known_classes[at], known_npv[at]
+
+    step = 1 << depth
+    axes = np.meshgrid(*[np.arange(initial) * step] * dims, indexing="ij")
+    cells = np.stack([a.ravel() for a in axes], axis=1)
+    while True:
+        corners = cells[:, None, :] + offsets * step
+        classes, _ = lookup(encode(corners))
+        classes = classes.reshape(len(cells), 2 ** dims)
+        mixed = (classes != classes[:, :1]).any(axis=1)
+        cells = cells[mixed]
+        if step == 1 or not len(cells):
+            break
+        step //= 2
+        cells = (cells[:, None, :] + offsets * step).reshape(-1, dims)
+
+    # Leaf edges whose two ends disagree; shared edges between leaves are kept once.
+    starts, axes_of_edge = [], []
+    for axis in range(dims):
+        lower = offsets[offsets[:, axis] == 0]
+        starts.append((cells[:, None, :] + lower).reshape(-1, dims))
+        axes_of_edge.append(np.full(len(starts[-1]), axis))
+    starts, axes_of_edge = np.concatenate(starts), np.concatenate(axes_of_edge)
+    ends = starts + np.eye(dims, dtype=starts.dtype)[axes_of_edge]
+    edge_codes = encode(starts) * dims + axes_of_edge
+    _, keep = np.unique(edge_codes, return_index=True)
+    starts, ends, axes_of_edge = starts[keep], ends[keep], axes_of_edge[keep]
+    class0, npv0 = lookup(encode(starts))
+    class1, npv1 = lookup(encode(ends))
+    crossing = class0 != class1
+    starts, axes_of_edge = starts[crossing], axes_of_edge[crossing]
+    class0, class1, npv0, npv1 = class0[crossing], class1[crossing], npv0[crossing], npv1[crossing]
+
+    if target == "npv":
+        # Linear interpolation of NPV along the edge.
+        t = np.clip((level - npv0) / (npv1 - npv0), 0.0, 1.0)
+        labels = np.zeros(len(t), dtype=np.int64)
+    else:
+        t = np.full(len(starts), 0.5)
+        labels = np.minimum(class0, class1)
+    lattice = starts.astype(float)
+    lattice[np.arange(len(lattice)), axes_of_edge] += t
+    width = (high - low) / resolution
+    return Boundary(
+        fields=fields,
+        target=target,
+        level=level,
+        horizon=base.financials.years,
+        points=low + lattice * width,
+        labels=labels,
+        tolerance={f: float(w) for f, w in zip(fields, width)},
+        evaluations=len(known_codes),
+        grid_evaluations=(resolution + 1) ** dims,
+    )
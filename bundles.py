@@ -0,0 +1,320 @@
+"""
+Scenario bundles: many `TEAConfig` records in one JSON Lines or Parquet file.
+
+Bundles are read in chunks straight into `BatchInputs` arrays, without building a
+dataclass per record, and each chunk is validated in bulk against the bounds in
+`TEA_CONFIG_SCHEMA`. `import_directory` / `export_directory` convert between a bundle
+and the one-file-per-scenario layout of `configs/`.
+
+    python bundles.py import configs scenarios.parquet
+    python bundles.py export scenarios.parquet configs
+"""
+import argparse
+import json
+import os
+import re
+from dataclasses import fields
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from batch import BatchInputs
+from models import TEAConfig, ScenarioConfig, FinancialInputsConfig, TEA_CONFIG_SCHEMA
+
+SCENARIO_FIELDS = [f.name for f in fields(ScenarioConfig)]
+FINANCIAL_FIELDS = [f.name for f in fields(FinancialInputsConfig)]
+SCHEDULE_FIELDS = ("subscriber_growth_rate", "opex_growth_rate", "subscription_fee", "pay_per_use_fee", "capex")
+GROWTH_FIELDS = ("subscriber_growth_rate", "opex_growth_rate")
+NUMERIC_FIELDS = [f for f in SCENARIO_FIELDS + FINANCIAL_FIELDS if f != "name"]
+DEFAULT_CHUNK_SIZE = 10_000
+
+PARQUET_SCHEMA = pa.schema(
+    [("id", pa.string()), ("name", pa.string())]
+    + [(f, pa.list_(pa.float64()) if f in SCHEDULE_FIELDS else pa.float64())
+       for f in NUMERIC_FIELDS if f != "years"]
+    + [("years", pa.int64())]
+)
+
+Record = Union[TEAConfig, Dict[str, Any]]
+
+
+class BundleValidationError(ValueError):
+    """Raised when records in a bundle chunk violate `TEA_CONFIG_SCHEMA`."""
+
+
+def _field_bounds() -> Dict[str, Dict[str, float]]:
+    bounds = {}
+    for section in ("scenario", "financials"):
+        for name, spec in TEA_CONFIG_SCHEMA["properties"][section]["properties"].items():
+            number = spec["oneOf"][0] if "oneOf" in spec else spec
+            bounds[name] = {k: v for k, v in number.items() if k != "type"}
+    return bounds
+
+
+_BOUNDS = _field_bounds()
+
+
+# --- Ragged schedule columns -------------------------------------------------
+
+def _ragged(values: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    # Scalars and per-year lists from JSON records -> (offsets, flat values).
+    lengths = np.fromiter((len(v) if isinstance(v, list) else 1 for v in values), dtype=np.int64, count=len(values))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    flat = []
+    for v in values:
+        if isinstance(v, list):
+            flat.extend(v)
+        else:
+            flat.append(v)
+    return offsets, np.asarray(flat, dtype=float)
+
+
+def _expand_ragged(offsets: np.ndarray, flat: np.ndarray, length: int, one_time: bool = False) -> np.ndarray:
+    """Vectorized `expand_schedule` over many rows stored as offsets into `flat`."""
+    starts, lengths = offsets[:-1], np.diff(offsets)
+    cols = np.arange(length)
+    index = starts[:, None] + np.minimum(cols, np.maximum(lengths[:, None] - 1, 0))
+    expanded = flat[np.minimum(index, max(len(flat) - 1, 0))] if len(flat) else np.zeros(index.shape)
+    if one_time:
+        expanded = np.where(cols < lengths[:, None], expanded, 0.0)
+    return expanded
+
+
+# --- Bulk validation ---------------------------------------------------------
+
+def _violations(values: np.ndarray, bounds: Dict[str, float]) -> np.ndarray:
+    bad = ~np.isfinite(values)
+    if "minimum" in bounds:
+        bad |= values < bounds["minimum"]
+    if "exclusiveMinimum" in bounds:
+        bad |= values <= bounds["exclusiveMinimum"]
+    if "maximum" in bounds:
+        bad |= values > bounds["maximum"]
+    return bad
+
+
+def validate_chunk(scalars: Dict[str, np.ndarray], schedules: Dict[str, Tuple[np.ndarray, np.ndarray]], first_row: int = 0):
+    """
+    Check a whole chunk against the schema bounds with array operations.
+
+    Raises `BundleValidationError` naming the offending fields and (bundle-wide) row numbers.
+    """
+    problems = []
+    for name, values in scalars.items():
+        bad = _violations(values, _BOUNDS[name])
+        if name == "years":
+            bad |= values != np.round(values)
+        if bad.any():
+            problems.append((name, np.flatnonzero(bad)))
+    for name, (offsets, flat) in schedules.items():
+        lengths = np.diff(offsets)
+        # A row is bad if it is empty or any of its entries is out of bounds.
+        bad = lengths == 0
+        row_of = np.repeat(np.arange(len(lengths)), lengths)
+        bad[row_of[_violations(flat[offsets[0]:offsets[-1]], _BOUNDS[name])]] = True
+        if bad.any():
+            problems.append((name, np.flatnonzero(bad)))
+    if problems:
+        details = "; ".join(
+            f"{name}: rows {', '.join(str(first_row + r) for r in rows[:10])}{' …' if len(rows) > 10 else ''}"
+            for name, rows in problems
+        )
+        raise BundleValidationError(f"Invalid scenario records ({details})")
+
+
+def _to_batch(scalars, schedules, names, validate: bool, first_row: int) -> BatchInputs:
+    if validate:
+        validate_chunk(scalars, schedules, first_row)
+    horizon = int(scalars["years"].max(initial=1))
+    columns = dict(scalars)
+    for name, (offsets, flat) in schedules.items():
+        length = horizon - 1 if name in GROWTH_FIELDS else horizon
+        columns[name] = _expand_ragged(offsets, flat, length, one_time=name == "capex")
+    return BatchInputs.from_arrays(names=names, **columns)
+
+
+# --- Reading -----------------------------------------------------------------
+
+def _bundle_format(path: str) -> str:
+    if path.endswith(".jsonl") or path.endswith(".ndjson"):
+        return "jsonl"
+    if path.endswith(".parquet"):
+        return "parquet"
+    raise ValueError(f"Unknown bundle format for '{path}' (expected .jsonl or .parquet)")
+
+
+def _flatten(record: Record, row: Optional[int] = None) -> Dict[str, Any]:
+    data = record.to_dict() if isinstance(record, TEAConfig) else record
+    where = f"row {row}: " if row is not None else ""
+    if not isinstance(data, dict):
+        raise BundleValidationError(f"Invalid scenario records ({where}expected an object, got {type(data).__name__})")
+    missing = [section for section in ("scenario", "financials") if not isinstance(data.get(section), dict)]
+    if missing:
+        raise BundleValidationError(f"Invalid scenario records ({where}missing {' and '.join(missing)})")
+    flat = {"id": data.get("id")}
+    flat.update(data["scenario"])
+    flat.update(data["financials"])
+    return flat
+
+
+def _jsonl_chunks(path: str, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk, row = [], 0
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise BundleValidationError(f"Invalid scenario records (row {row}: {e})") from e
+                chunk.append(_flatten(record, row))
+                row += 1
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def _columns_from_rows(rows: List[Dict[str, Any]]):
+    try:
+        scalars = {
+            name: np.array([r.get(name, 1.0 if name == "subscription_ratio" else np.nan) for r in rows], dtype=float)
+            for name in NUMERIC_FIELDS if name not in SCHEDULE_FIELDS
+        }
+        schedules = {name: _ragged([r.get(name, []) for r in rows]) for name in SCHEDULE_FIELDS}
+    except (TypeError, ValueError) as e:
+        raise BundleValidationError(f"Non-numeric value in scenario records: {e}")
+    return scalars, schedules, [r.get("name") for r in rows]
+
+
+def _columns_from_batch(batch: pa.RecordBatch):
+    scalars, schedules = {}, {}
+    for name in NUMERIC_FIELDS:
+        column = batch.column(name)
+        if name in SCHEDULE_FIELDS and pa.types.is_list(column.type):
+            schedules[name] = (column.offsets.to_numpy(), column.values.to_numpy(zero_copy_only=False).astype(float))
+        elif name in SCHEDULE_FIELDS:
+            schedules[name] = (np.arange(len(column) + 1), column.to_numpy(zero_copy_only=False).astype(float))
+        else:
+            scalars[name] = column.to_numpy(zero_copy_only=False).astype(float)
+    return scalars, schedules, batch.column("name").to_pylist()
+
+
+def iter_bundle(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, validate: bool = True) -> Iterator[BatchInputs]:
+    """Stream a bundle as `BatchInputs` chunks of at most `chunk_size` scenarios."""
+    first_row = 0
+    if _bundle_format(path) == "parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield _to_batch(*_columns_from_batch(batch), validate=validate, first_row=first_row)
+            first_row += batch.num_rows
+    else:
+        for rows in _jsonl_chunks(path, chunk_size):
+            yield _to_batch(*_columns_from_rows(rows), validate=validate, first_row=first_row)
+            first_row += len(rows)
+
+
+def iter_records(path: str) -> Iterator[Tuple[str, TEAConfig]]:
+    """Yield `(id, TEAConfig)` pairs one record at a time, e.g. for exporting."""
+    if _bundle_format(path) == "parquet":
+        rows = (row for batch in pq.ParquetFile(path).iter_batches() for row in batch.to_pylist())
+    else:
+        rows = (row for chunk in _jsonl_chunks(path, DEFAULT_CHUNK_SIZE) for row in chunk)
+    for row in rows:
+        for name in SCHEDULE_FIELDS:
+            if isinstance(row[name], list) and len(row[name]) == 1:
+                row[name] = row[name][0]
+        if row.get("subscription_ratio") is None:
+            row.pop("subscription_ratio", None)
+        row["years"] = int(row["years"])
+        config = TEAConfig.from_dict({
+            "scenario": {k: row[k] for k in SCENARIO_FIELDS},
+            "financials": {k: row[k] for k in FINANCIAL_FIELDS if k in row},
+        })
+        yield row.get("id"), config
+
+
+# --- Writing -----------------------------------------------------------------
+
+def write_bundle(records: Iterable[Record], path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """
+    Write `TEAConfig`s (or config dicts, optionally with an `"id"`) to a bundle.
+
+    Records are consumed lazily and written `chunk_size` at a time. Returns the record count.
+    """
+    count = 0
+    if _bundle_format(path) == "jsonl":
+        with open(path, "w") as f:
+            for record in records:
+                data = record.to_dict() if isinstance(record, TEAConfig) else record
+                f.write(json.dumps(data) + "\n")
+                count += 1
+        return count
+
+    def table(rows):
+        columns = {name: [r.get(name) for r in rows] for name in PARQUET_SCHEMA.names}
+        for name in SCHEDULE_FIELDS:
+            columns[name] = [v if isinstance(v, list) else [v] for v in columns[name]]
+        columns["subscription_ratio"] = [1.0 if v is None else v for v in columns["subscription_ratio"]]
+        return pa.table(columns, schema=PARQUET_SCHEMA)
+
+    with pq.ParquetWriter(path, PARQUET_SCHEMA) as writer:
+        rows = []
+        for record in records:
+            rows.append(_flatten(record))
+            if len(rows) == chunk_size:
+                writer.write_table(table(rows))
+                count += len(rows)
+                rows = []
+        if rows:
+            writer.write_table(table(rows))
+            count += len(rows)
+    return count
+
+
+# --- Conversion to and from configs/ -----------------------------------------
+
+def import_directory(config_dir: str, path: str) -> int:
+    """Bundle every `*.json` config in `config_dir`, using the file name as record id."""
+    def records():
+        for file in sorted(os.listdir(config_dir)):
+            if file.endswith(".json"):
+                data = TEAConfig.from_json(os.path.join(config_dir, file)).to_dict()
+                data["id"] = file[:-len(".json")]
+                yield data
+    return write_bundle(records(), path)
+
+
+def export_directory(path: str, config_dir: str, overwrite: bool = False) -> int:
+    """Write each bundle record to `config_dir/<id>.json`; returns the number of files written."""
+    os.makedirs(config_dir, exist_ok=True)
+    count = 0
+    for row, (record_id, config) in enumerate(iter_records(path)):
+        stem = record_id or f"{re.sub(r'[^A-Za-z0-9_-]+', '_', config.scenario.name)}_{row}"
+        target = os.path.join(config_dir, f"{stem}.json")
+        if os.path.exists(target) and not overwrite:
+            raise FileExistsError(f"'{target}' already exists (use overwrite=True)")
+        config.to_json(target)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert between scenario bundles and config directories.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Bundle a directory of JSON configs")
+    imp.add_argument("config_dir")
+    imp.add_argument("bundle")
+    exp = sub.add_parser("export", help="Write bundle records as JSON configs")
+    exp.add_argument("bundle")
+    exp.add_argument("config_dir")
+    exp.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        n = import_directory(args.config_dir, args.bundle)
+        print(f"✅ Bundled {n} configs into {args.bundle}")
+    else:
+        n = export_directory(args.bundle, args.config_dir, overwrite=args.overwrite)
+        print(f"✅ Exported {n} configs to {args.config_dir}")
@@ -1,74 +1,125 @@
-
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 import numpy as np
 
+# A config value that is either constant over the projection or given per year.
+Schedule = Union[float, Sequence[float]]
+
+
+def expand_schedule(value: Schedule, length: int, fill: Optional[float] = None) -> np.ndarray:
+    """
+    Broadcast a scalar or per-year schedule to exactly `length` values.
+
+    A scalar is repeated for every year, unless `fill` is given, in which case it only
+    applies to the first year (e.g. an up-front CAPEX). A list shorter than `length` is
+    padded with its last entry (or `fill`), and a longer list is cut off at the horizon.
+    """
+    if np.ndim(value) == 0:
+        if fill is None:
+            return np.full(length, float(value))
+        value = [value]
+    values = np.asarray(value, dtype=float)[:length]
+    if len(values) == 0:
+        if length == 0:
+            return values
+        raise ValueError("A per-year schedule needs at least one value")
+    pad = values[-1] if fill is None else fill
+    return np.concatenate([values, np.full(length - len(values), pad)])
+
+
+def _percent(value: Schedule) -> Schedule:
+    if np.ndim(value) == 0:
+        return value / 100
+    return np.asarray(value, dtype=float) / 100
+
+
 class Scenario:
-    def __init__(self, name: str, subscriber_growth_rate: float, opex_growth_rate: float, discount_rate: float):
+    def __init__(self, name: str, subscriber_growth_rate: Schedule, opex_growth_rate: Schedule, discount_rate: float):
         self.name = name
-        self.subscriber_growth_rate = subscriber_growth_rate / 100
-        self.opex_growth_rate = opex_growth_rate / 100
+        self.subscriber_growth_rate = _percent(subscriber_growth_rate)
+        self.opex_growth_rate = _percent(opex_growth_rate)
         self.discount_rate = discount_rate / 100
 
 class FinancialInputs:
     def __init__(self,
                  starting_subscribers: int,
-                 subscription_fee: float,
-                 pay_per_use_fee: float,
+                 subscription_fee: Schedule,
+                 pay_per_use_fee: Schedule,
                  base_opex: float,
-                 capex: float = 0.0,
+                 capex: Schedule = 0.0,
                  years: int = 5,
                  subscription_ratio: float = 1.0 ):
         self.starting_subscribers = starting_subscribers
         self.subscription_fee = subscription_fee
         self.pay_per_use_fee = pay_per_use_fee
         self.base_opex = base_opex
-        self.capex = capex
+        self.capex = capex  # one-time in Year 0, or a per-year staged schedule
         self.years = years
         self.subscription_ratio = subscription_ratio  # 0.0 to 1.0
 
 class TEACalculator:
+    """
+    Reference (year-by-year) implementation of the projections.
+
+    Growth rates, fees and CAPEX may be scalars or per-year schedules. Growth schedules
+    hold the growth from one year to the next (`years - 1` values), fee and CAPEX
+    schedules hold one value per projected year. See `batch.evaluate_batch` for the
+    vectorized equivalent used when many scenarios are evaluated at once.
+    """
 
     def __init__(self, scenario: Scenario, inputs: FinancialInputs):
         self.scenario = scenario
         self.inputs = inputs
 
     def project_subscribers(self) -> List[int]:
+        growth = expand_schedule(self.scenario.subscriber_growth_rate, self.inputs.years - 1)
         subs = [self.inputs.starting_subscribers]
-        for _ in range(1, self.inputs.years):
-            subs.append(subs[-1] * (1 + self.scenario.subscriber_growth_rate))
+        for g in growth.tolist():
+            subs.append(subs[-1] * (1 + g))
         return [int(s) for s in subs]
 
     def project_opex(self) -> List[float]:
+        growth = expand_schedule(self.scenario.opex_growth_rate, self.inputs.years - 1)
         opex = [self.inputs.base_opex]
-        for _ in range(1, self.inputs.years):
-            opex.append(opex[-1] * (1 + self.scenario.opex_growth_rate))
+        for g in growth.tolist():
+            opex.append(opex[-1] * (1 + g))
         return opex
 
+    def project_fees(self) -> Tuple[List[float], List[float]]:
+        years = self.inputs.years
+        sub_fees = expand_schedule(self.inputs.subscription_fee, years).tolist()
+        ppu_fees = expand_schedule(self.inputs.pay_per_use_fee, years).tolist()
+        return sub_fees, ppu_fees
+
+    def project_capex(self) -> List[float]:
+        return expand_schedule(self.inputs.capex, self.inputs.years, fill=0.0).tolist()
+
     def project_revenue(self) -> List[float]:
         subscribers = self.project_subscribers()
+        sub_fees, ppu_fees = self.project_fees()
         r_sub = self.inputs.subscription_ratio
         r_ppu = 1 - r_sub
 
         revenue = []
-        for s in subscribers:
+        for s, sub_fee, ppu_fee in zip(subscribers, sub_fees, ppu_fees):
             s_sub = s * r_sub
             s_ppu = s * r_ppu
-            total = (s_sub * self.inputs.subscription_fee) + (s_ppu * self.inputs.pay_per_use_fee)
+            total = (s_sub * sub_fee) + (s_ppu * ppu_fee)
             revenue.append(total)
         return revenue
 
     def project_revenue_breakdown(self) -> Tuple[List[float], List[float]]:
         subscribers = self.project_subscribers()
+        sub_fees, ppu_fees = self.project_fees()
         r_sub = self.inputs.subscription_ratio
         r_ppu = 1 - r_sub
 
         rev_sub = []
         rev_ppu = []
-        for s in subscribers:
+        for s, sub_fee, ppu_fee in zip(subscribers, sub_fees, ppu_fees):
             s_sub = s * r_sub
             s_ppu = s * r_ppu
-            rev_sub.append(s_sub * self.inputs.subscription_fee)
-            rev_ppu.append(s_ppu * self.inputs.pay_per_use_fee)
+            rev_sub.append(s_sub * sub_fee)
+            rev_ppu.append(s_ppu * ppu_fee)
 
         return rev_sub, rev_ppu
 
@@ -79,11 +130,11 @@ class TEACalculator:
 
     def calculate_cumulative_cash_flow(self) -> List[float]:
         profit = self.calculate_profit()
-        capex = self.inputs.capex
+        capex = self.project_capex()
         cum_cf = []
-        total = -capex
-        for p in profit:
-            total += p
+        total = 0.0
+        for p, c in zip(profit, capex):
+            total += p - c
             cum_cf.append(total)
         return cum_cf
 
@@ -94,7 +145,37 @@ class TEACalculator:
 
     def calculate_roi(self) -> float:
         total_profit = sum(self.calculate_profit())
-        return (total_profit - self.inputs.capex) / self.inputs.capex if self.inputs.capex > 0 else float('inf')
+        total_capex = sum(self.project_capex())
+        return (total_profit - total_capex) / total_capex if total_capex > 0 else float('inf')
+
+    def calculate_sensitivities(self) -> Dict[str, Dict[str, object]]:
+        """
+        Analytic partial derivatives of NPV, cumulative cash flow and the reverse-pricing fee
+        with respect to every input, e.g. `sens["npv"]["subscription_fee"]`.
+
+        See `batch._gradients` for units and conventions.
+        """
+        # Imported here because the batch engine builds on this module.
+        from batch import BatchInputs, evaluate_batch
+
+        years = self.inputs.years
+        inputs = BatchInputs.from_arrays(
+            years=[years],
+            starting_subscribers=[self.inputs.starting_subscribers],
+            subscriber_growth_rate=[expand_schedule(self.scenario.subscriber_growth_rate, years - 1) * 100],
+            opex_growth_rate=[expand_schedule(self.scenario.opex_growth_rate, years - 1) * 100],
+            discount_rate=[self.scenario.discount_rate * 100],
+            subscription_fee=[expand_schedule(self.inputs.subscription_fee, years)],
+            pay_per_use_fee=[expand_schedule(self.inputs.pay_per_use_fee, years)],
+            base_opex=[self.inputs.base_opex],
+            capex=[expand_schedule(self.inputs.capex, years, fill=0.0)],
+            subscription_ratio=[self.inputs.subscription_ratio],
+        )
+        gradients = evaluate_batch(inputs, gradients=True)["gradients"]
+        return {
+            output: {name: values[0].tolist() if values.ndim == 2 else float(values[0]) for name, values in by_input.items()}
+            for output, by_input in gradients.items()
+        }
 
     def calculate_breakeven_year(self) -> int:
         cashflow = self.calculate_cumulative_cash_flow()
@@ -102,4 +183,3 @@ class TEACalculator:
             if cf >= 0:
                 return i + 1
         return -1  # No breakeven within given years
-
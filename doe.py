@@ -0,0 +1,357 @@
+"""
+Design-of-experiments scenario generation.
+
+A design gives a range and a distribution for some `ScenarioConfig` /
+`FinancialInputsConfig` fields. All other fields come from a base `TEAConfig`:
+
+    {
+      "subscription_fee": {"low": 1000, "high": 8000},
+      "subscriber_growth_rate": {"low": 5, "high": 40, "distribution": "triangular", "mode": 20},
+      "starting_subscribers": {"low": 10, "high": 10000, "distribution": "log_uniform"},
+      "years": {"values": [5, 8, 10]}
+    }
+
+Points are placed on the unit hypercube with a full grid, a Latin hypercube or a Sobol
+sequence, then mapped through each field's inverse CDF. Every generator can compute
+any point from its index alone. Designs are therefore produced lazily, `chunk_size`
+points at a time, as `BatchInputs` blocks for `evaluate_batch`, and can be split into
+index ranges like sweep shards. A 10^7-point design never exists as a whole in memory.
+
+    python doe.py --base configs/moderate.json --design design.json --method sobol \\
+        --points 10000000 --output results.parquet
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from batch import BatchInputs, evaluate_batch
+from bundles import NUMERIC_FIELDS, validate_chunk
+from models import TEAConfig
+from sweep import MAX_SWEEP_SIZE, chunk_state, decode, empty_state, grid_batch, merge_states, summarize, sweep_size
+
+DEFAULT_CHUNK_SIZE = 65_536
+METHODS = ("grid", "lhs", "sobol")
+DISTRIBUTIONS = ("uniform", "log_uniform", "triangular", "integer", "choice")
+RESULT_METRICS = ("npv", "roi", "breakeven_year")
+
+# Sobol direction numbers (Joe & Kuo, new-joe-kuo-6.21201) for dimensions 2 and up:
+# (degree s, polynomial coefficients a, initial m_1..m_s). Dimension 1 is van der Corput.
+_SOBOL_DIRECTIONS = (
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+)
+_SOBOL_BITS = 32
+
+
+@dataclass
+class Dimension:
+    """One varied field: a `[low, high]` range with a distribution, or explicit `values`."""
+    name: str
+    low: Optional[float] = None
+    high: Optional[float] = None
+    distribution: str = "uniform"
+    mode: Optional[float] = None
+    values: Optional[List[float]] = None
+    levels: Optional[int] = None
+
+    def __post_init__(self):
+        if self.name not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown design field '{self.name}' (expected one of {', '.join(NUMERIC_FIELDS)})")
+        if self.values is not None:
+            self.distribution = "choice"
+            if len(self.values) == 0:
+                raise ValueError(f"'{self.name}': 'values' must not be empty")
+            return
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(f"'{self.name}': unknown distribution '{self.distribution}'")
+        if self.low is None or self.high is None or not self.low <= self.high:
+            raise ValueError(f"'{self.name}': needs 'low' <= 'high'")
+        if self.distribution == "log_uniform" and self.low <= 0:
+            raise ValueError(f"'{self.name}': a log-uniform range must be positive")
+        if self.distribution == "triangular" and not (self.mode is not None and self.low <= self.mode <= self.high):
+            raise ValueError(f"'{self.name}': a triangular distribution needs low <= 'mode' <= high")
+        if self.name == "years" and self.distribution != "integer":
+            raise ValueError("'years' must use the 'integer' distribution or explicit 'values'")
+
+    @staticmethod
+    def from_dict(name: str, data: Dict[str, Any]) -> "Dimension":
+        return Dimension(name=name, **data)
+
+    def ppf(self, u: np.ndarray) -> np.ndarray:
+        """Inverse CDF: map unit-interval values `u` to field values."""
+        if self.distribution == "choice":
+            values = np.asarray(self.values, dtype=float)
+            return values[np.minimum((u * len(values)).astype(np.int64), len(values) - 1)]
+        low, high = float(self.low), float(self.high)
+        if self.distribution == "uniform":
+            return low + u * (high - low)
+        if self.distribution == "log_uniform":
+            return np.exp(np.log(low) + u * (np.log(high) - np.log(low)))
+        if self.distribution == "integer":
+            return np.minimum(np.floor(low + u * (np.floor(high) - low + 1)), np.floor(high))
+        # Triangular: the two branches of the inverse CDF meet at the mode.
+        width = high - low
+        if width == 0:
+            return np.full(len(u), low)
+        split = (self.mode - low) / width
+        return np.where(
+            u < split,
+            low + np.sqrt(u * width * (self.mode - low)),
+            high - np.sqrt((1 - u) * width * (high - self.mode)),
+        )
+
+    def grid_values(self, levels: int) -> np.ndarray:
+        """Grid levels: every value for `choice`/`integer`, else `levels` quantiles including both ends."""
+        if self.distribution == "choice":
+            return np.asarray(self.values, dtype=float)
+        if self.distribution == "integer":
+            return np.arange(np.ceil(self.low), np.floor(self.high) + 1)
+        levels = self.levels or levels
+        return self.ppf(np.linspace(0.0, 1.0, levels) if levels > 1 else np.array([0.5]))
+
+
+def load_design(path: str) -> List[Dimension]:
+    """Read `{field: {low, high, distribution, ...}}` from a JSON file."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    return [Dimension.from_dict(name, spec) for name, spec in data.items()]
+
+
+# --- Index-addressable unit-cube points ---------------------------------------
+
+def _splitmix(x: np.ndarray) -> np.ndarray:
+    # SplitMix64 finalizer: a well-mixed uint64 hash (arithmetic wraps modulo 2^64).
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _permute(indices: np.ndarray, n: int, key: int) -> np.ndarray:
+    """
+    A pseudo-random permutation of `range(n)` evaluated at `indices`, without storing it.
+
+    A 4-round Feistel network permutes the smallest even-bit-width domain holding `n`.
+    Values that land outside `range(n)` are permuted again (cycle walking) until they
+    land inside.
+    """
+    half = max((int(n - 1).bit_length() + 1) // 2, 1)
+    mask = np.uint64((1 << half) - 1)
+    keys = _splitmix(np.arange(4, dtype=np.uint64) + np.uint64(key))
+
+    def feistel(x):
+        left, right = x >> np.uint64(half), x & mask
+        for k in keys:
+            left, right = right, left ^ (_splitmix(right ^ k) & mask)
+        return (left << np.uint64(half)) | right
+
+    x = feistel(indices.astype(np.uint64))
+    outside = x >= np.uint64(n)
+    while outside.any():
+        x[outside] = feistel(x[outside])
+        outside = x >= np.uint64(n)
+    return x.astype(np.int64)
+
+
+def _uniform(indices: np.ndarray, key: int) -> np.ndarray:
+    # Counter-based uniforms in [0, 1): the same index and key always give the same value.
+    bits = _splitmix(indices.astype(np.uint64) ^ _splitmix(np.full(1, key, dtype=np.uint64)))
+    return (bits >> np.uint64(11)).astype(float) * 2.0 ** -53
+
+
+def _sobol_directions(dims: int) -> np.ndarray:
+    if dims > len(_SOBOL_DIRECTIONS) + 1:
+        raise ValueError(f"Sobol designs support at most {len(_SOBOL_DIRECTIONS) + 1} fields")
+    v = np.zeros((dims, _SOBOL_BITS), dtype=np.uint64)
+    v[0] = [1 << (_SOBOL_BITS - 1 - k) for k in range(_SOBOL_BITS)]
+    for d in range(1, dims):
+        s, a, m = _SOBOL_DIRECTIONS[d - 1]
+        row = [m[k] << (_SOBOL_BITS - 1 - k) for k in range(s)]
+        for k in range(s, _SOBOL_BITS):
+            value = row[k - s] ^ (row[k - s] >> s)
+            for i in range(1, s):
+                if (a >> (s - 1 - i)) & 1:
+                    value ^= row[k - i]
+            row.append(value)
+        v[d] = row
+    return v
+
+
+class Design:
+    """
+    A design over `dimensions`, addressable by point index.
+
+    `method="grid"` is the full factorial over each dimension's `grid_values` and has
+    one point per combination. `"lhs"` and `"sobol"` have `points` points. The Latin
+    hypercube stratifies every dimension into `points` equal-probability bins with one
+    point per bin. The Sobol sequence is digitally shifted by `seed`; use `seed=None`
+    for the plain sequence, which starts at the origin.
+    """
+
+    def __init__(self, dimensions: Sequence[Dimension], method: str = "sobol",
+                 points: Optional[int] = None, levels: int = 5, seed: Optional[int] = 0):
+        if method not in METHODS:
+            raise ValueError(f"Unknown design method '{method}' (expected one of {', '.join(METHODS)})")
+        if not dimensions:
+            raise ValueError("A design needs at least one dimension")
+        names = [d.name for d in dimensions]
+        if len(set(names)) != len(names):
+            raise ValueError("Design fields must be unique")
+        if method != "grid" and not points:
+            raise ValueError(f"A '{method}' design needs a number of points")
+        limit = 2 ** _SOBOL_BITS if method == "sobol" else MAX_SWEEP_SIZE
+        if method != "grid" and int(points) > limit:
+            raise ValueError(f"A '{method}' design supports at most {limit:,} points")
+        self.dimensions = list(dimensions)
+        self.method = method
+        self.seed = seed
+        if method == "grid":
+            self.space = {d.name: d.grid_values(levels) for d in self.dimensions}
+            self.size = sweep_size(self.space)
+        else:
+            self.size = int(points)
+        if method == "sobol":
+            self._directions = _sobol_directions(len(self.dimensions))
+            shift = _splitmix(np.arange(len(self.dimensions), dtype=np.uint64) + np.uint64(seed or 0))
+            self._shift = shift >> np.uint64(64 - _SOBOL_BITS) if seed is not None else np.zeros(len(self.dimensions), np.uint64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def unit(self, indices: np.ndarray) -> np.ndarray:
+        """Unit-cube coordinates `(len(indices), dims)` of LHS or Sobol points."""
+        dims = len(self.dimensions)
+        if self.method == "lhs":
+            seed = self.seed or 0
+            u = np.empty((len(indices), dims))
+            for d in range(dims):
+                key = (seed * 1_000_003 + d) * 2
+                u[:, d] = (_permute(indices, self.size, key) + _uniform(indices, key + 1)) / self.size
+            return u
+        if self.method == "sobol":
+            gray = indices.astype(np.uint64)
+            gray ^= gray >> np.uint64(1)
+            x = np.tile(self._shift, (len(indices), 1))
+            for bit in range(_SOBOL_BITS):
+                on = ((gray >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+                x[on] ^= self._directions[:, bit]
+            return x.astype(float) * 2.0 ** -_SOBOL_BITS
+        raise ValueError("Grid designs have no unit-cube coordinates; use `values`")
+
+    def values(self, indices: np.ndarray) -> Dict[str, np.ndarray]:
+        """Field values of the design points at `indices`."""
+        if self.method == "grid":
+            return decode(self.space, indices)
+        u = self.unit(indices)
+        return {d.name: d.ppf(u[:, j]) for j, d in enumerate(self.dimensions)}
+
+    def chunks(self, start: int = 0, stop: Optional[int] = None,
+               chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+        """Yield `(indices, values)` for points `[start, stop)`, `chunk_size` at a time."""
+        stop = self.size if stop is None else min(stop, self.size)
+        for lo in range(start, stop, chunk_size):
+            indices = np.arange(lo, min(lo + chunk_size, stop), dtype=np.int64)
+            yield indices, self.values(indices)
+
+
+# --- Evaluation and result store ----------------------------------------------
+
+def iter_design(base: TEAConfig, design: Design, start: int = 0, stop: Optional[int] = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                validate: bool = True) -> Iterator[Tuple[np.ndarray, Dict[str, np.ndarray], BatchInputs]]:
+    """
+    Yield `(indices, values, batch)` blocks of the design applied on top of `base`.
+
+    With `validate=True` each block is checked against the schema bounds, so a design
+    whose range leaves the valid input space fails on the first block, naming the points.
+    """
+    for indices, values in design.chunks(start, stop, chunk_size):
+        if validate:
+            validate_chunk(values, {}, first_row=int(indices[0]))
+        yield indices, values, grid_batch(base, values)
+
+
+def evaluate_design(base: TEAConfig, design: Design, start: int = 0, stop: Optional[int] = None,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[pa.Table]:
+    """Evaluate the design block by block; yields one table of inputs and `RESULT_METRICS` per block."""
+    for indices, values, batch in iter_design(base, design, start, stop, chunk_size):
+        results = evaluate_batch(batch)
+        columns = {"index": indices, **values, **{m: results[m] for m in RESULT_METRICS}}
+        yield pa.table(columns)
+
+
+def run_design(base: TEAConfig, design: Design, path: str,
+               chunk_size: int = DEFAULT_CHUNK_SIZE,
+               on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Evaluate a whole design and stream the results to a Parquet file, one row group per
+    block. Returns the number of points written.
+    """
+    count = 0
+    writer = None
+    try:
+        for table in evaluate_design(base, design, chunk_size=chunk_size):
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            count += table.num_rows
+            if on_progress:
+                on_progress(count, len(design))
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def study_design(base: TEAConfig, design: Design, top_k: int = 10, metric: str = "npv", largest: bool = True,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 on_progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Evaluate a design into running aggregates and the top-k points (like a sweep),
+    without storing per-point results. `on_progress(done, total, summary)` is called
+    after every block with the summary so far.
+    """
+    spec = {"metric": metric}
+    state = empty_state()
+    for indices, _, batch in iter_design(base, design, chunk_size=chunk_size):
+        state = merge_states(state, chunk_state(evaluate_batch(batch), indices, top_k, metric, largest), top_k, largest)
+        if on_progress:
+            on_progress(state["count"], len(design), summarize(spec, state, design.values))
+    return summarize(spec, state, design.values)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and evaluate design-of-experiments scenario sets.")
+    parser.add_argument("--base", required=True, help="Base config JSON")
+    parser.add_argument("--design", required=True, help="JSON file mapping fields to ranges and distributions")
+    parser.add_argument("--method", choices=METHODS, default="sobol")
+    parser.add_argument("--points", type=int, help="Number of points (lhs, sobol)")
+    parser.add_argument("--levels", type=int, default=5, help="Levels per continuous field (grid)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--output", required=True, help="Parquet file for the results")
+    args = parser.parse_args()
+
+    design = Design(load_design(args.design), method=args.method, points=args.points, levels=args.levels, seed=args.seed)
+    print(f"🧪 Evaluating a {args.method} design of {len(design):,} points")
+    started = time.perf_counter()
+    n = run_design(
+        TEAConfig.from_json(args.base), design, args.output, chunk_size=args.chunk_size,
+        on_progress=lambda done, total: print(f"  {done:,}/{total:,} points", flush=True),
+    )
+    print(f"✅ Wrote {n:,} results to {args.output} in {time.perf_counter() - started:.1f}s")
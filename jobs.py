@@ -0,0 +1,221 @@
+"""
+Background jobs for long computations started from the Streamlit pages.
+
+Streamlit reruns a page from the top whenever a widget changes. Work done inline
+blocks the page, and it is thrown away if the user touches anything. Instead, pages
+submit jobs to the process-wide scheduler from `get_scheduler()`, keep the returned
+job id in `st.session_state`, and check on the job in later reruns.
+
+A job function takes a `JobContext` as its first argument. It calls `ctx.report(...)`
+from time to time to publish progress and partial results. The same call raises
+`JobCancelled` once the job has been cancelled, so cancellation takes effect at the
+next report. Submitting a job that is identical to one still queued or running (same
+function and arguments, or same `key`) returns the existing job. Finished jobs are
+kept for a while, so their results can be collected on a later rerun or by another
+session. Sessions pass a `subscriber` id when submitting and cancelling, so a job
+shared by several sessions only stops once every one of them has cancelled it.
+"""
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function when its job has been cancelled."""
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by `JobScheduler.submit` when `max_queued` jobs are already waiting."""
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    label: str
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    partial: Any = None
+    result: Any = None
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    subscribers: Set[str] = field(default_factory=set)
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _future: Any = field(default=None, repr=False)
+
+    @property
+    def active(self) -> bool:
+        return self.status not in FINISHED
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+class JobContext:
+    """Handle a running job uses to report progress and notice cancellation."""
+
+    def __init__(self, job: Job):
+        self._job = job
+
+    @property
+    def cancelled(self) -> bool:
+        return self._job._cancel.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def report(self, done: float, total: Optional[float] = None, partial: Any = None, message: Optional[str] = None):
+        """Publish progress (`done / total`, or a 0-1 fraction), an optional partial result and status text."""
+        self.check()
+        self._job.progress = min(max(done / total if total else done, 0.0), 1.0)
+        if partial is not None:
+            self._job.partial = partial
+        if message is not None:
+            self._job.message = message
+
+
+def job_key(fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Identity of a job: the function and a hash of its pickled arguments."""
+    try:
+        payload = pickle.dumps((args, sorted(kwargs.items())), protocol=4)
+    except Exception as exc:
+        raise TypeError("Job arguments must be picklable to deduplicate jobs; pass an explicit key") from exc
+    return f"{fn.__module__}.{fn.__qualname__}:{hashlib.blake2b(payload, digest_size=16).hexdigest()}"
+
+
+class JobScheduler:
+    """
+    Bounded thread pool running `Job`s.
+
+    At most `max_workers` jobs run at once and at most `max_queued` wait. The
+    `keep_finished` most recently finished jobs stay available for `get`. NumPy releases
+    the GIL for most array work. Jobs that need more CPU can start their own worker
+    processes, e.g. `sweep.run_sweep`.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 16, keep_finished: int = 32):
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tea-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_key: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    # --- submitting ---
+
+    def submit(self, fn: Callable, *args, key: Optional[str] = None, label: Optional[str] = None,
+               reuse_finished: bool = True, subscriber: Optional[str] = None, **kwargs) -> Job:
+        """
+        Queue `fn(ctx, *args, **kwargs)` and return its `Job`.
+
+        An identical job that is still queued or running is returned instead of starting
+        a new one. So is a finished one that succeeded, unless `reuse_finished=False`.
+        `subscriber` (e.g. a session id) is added to the job's subscribers; see `cancel`.
+        """
+        key = key or job_key(fn, args, kwargs)
+        with self._lock:
+            existing = self._jobs.get(self._by_key.get(key, ""))
+            if existing is not None and not existing._cancel.is_set() and (
+                    existing.active or (reuse_finished and existing.status == DONE)):
+                if subscriber is not None:
+                    existing.subscribers.add(subscriber)
+                return existing
+            if sum(job.status == QUEUED for job in self._jobs.values()) >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs are already waiting")
+            job = Job(id=uuid.uuid4().hex, key=key, label=label or fn.__name__)
+            if subscriber is not None:
+                job.subscribers.add(subscriber)
+            self._jobs[job.id] = job
+            self._by_key[key] = job.id
+            job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable, args: tuple, kwargs: Dict[str, Any]):
+        if job._cancel.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.result = fn(JobContext(job), *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, CANCELLED)
+        except Exception as exc:
+            job.error = f"{type(exc).__name__}: {exc}"
+            self._finish(job, FAILED)
+        else:
+            job.progress = 1.0
+            self._finish(job, DONE)
+
+    def _finish(self, job: Job, status: str):
+        with self._lock:
+            job.status, job.finished = status, time.time()
+            finished = [j for j in self._jobs.values() if not j.active]
+            for old in sorted(finished, key=lambda j: j.finished)[:max(len(finished) - self.keep_finished, 0)]:
+                del self._jobs[old.id]
+                if self._by_key.get(old.key) == old.id:
+                    del self._by_key[old.key]
+
+    # --- inspecting and controlling ---
+
+    def get(self, job_id: Optional[str]) -> Optional[Job]:
+        """The job with `job_id`, or None if it is unknown or was pruned."""
+        return self._jobs.get(job_id or "")
+
+    def jobs(self) -> List[Job]:
+        """All known jobs, oldest first."""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id: str, subscriber: Optional[str] = None) -> bool:
+        """
+        Cancel a queued job outright, or ask a running one to stop at its next report.
+
+        With `subscriber`, only that subscriber is removed; the job is cancelled once it
+        has no subscribers left. Returns True if the job was cancelled.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.active:
+                return False
+            job.subscribers.discard(subscriber)
+            if subscriber is not None and job.subscribers:
+                return False
+            job._cancel.set()
+        if job._future.cancel():
+            self._finish(job, CANCELLED)
+        return True
+
+    def shutdown(self, cancel: bool = True):
+        if cancel:
+            for job in self.jobs():
+                self.cancel(job.id)
+        self._executor.shutdown(wait=False, cancel_futures=cancel)
+
+
+_scheduler: Optional[JobScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> JobScheduler:
+    """The scheduler shared by all pages and sessions of this server process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
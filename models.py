@@ -1,37 +1,97 @@
-
-from dataclasses import dataclass, asdict, field
-from typing import Dict, Any
+from dataclasses import dataclass, asdict, field, fields
+from typing import Dict, Any, List, Union
 import json
 
+import jsonschema
+import numpy as np
+
+# Growth rates, fees and CAPEX accept either a scalar or a per-year array.
+Schedule = Union[float, List[float]]
+
+
+def _number_or_schedule(**bounds) -> Dict[str, Any]:
+    number = {"type": "number", **bounds}
+    return {"oneOf": [number, {"type": "array", "items": number, "minItems": 1}]}
+
+
+TEA_CONFIG_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["scenario", "financials"],
+    "properties": {
+        "scenario": {
+            "type": "object",
+            "required": ["name", "subscriber_growth_rate", "opex_growth_rate", "discount_rate"],
+            "additionalProperties": False,
+            "properties": {
+                "name": {"type": "string"},
+                "subscriber_growth_rate": _number_or_schedule(exclusiveMinimum=-100),
+                "opex_growth_rate": _number_or_schedule(exclusiveMinimum=-100),
+                "discount_rate": {"type": "number", "exclusiveMinimum": -100},
+            },
+        },
+        "financials": {
+            "type": "object",
+            "required": ["starting_subscribers", "subscription_fee", "pay_per_use_fee", "base_opex", "capex", "years"],
+            "additionalProperties": False,
+            "properties": {
+                "starting_subscribers": {"type": "number", "minimum": 0},
+                "subscription_fee": _number_or_schedule(minimum=0),
+                "pay_per_use_fee": _number_or_schedule(minimum=0),
+                "base_opex": {"type": "number", "minimum": 0},
+                "capex": _number_or_schedule(minimum=0),
+                "years": {"type": "integer", "minimum": 1},
+                "subscription_ratio": {"type": "number", "minimum": 0, "maximum": 1},
+            },
+        },
+    },
+}
 
-@dataclass
-class ScenarioConfig:
-    name: str
-    subscriber_growth_rate: float
-    opex_growth_rate: float
-    discount_rate: float
+
+# Checking the schema itself is slow, so build the validator once.
+_VALIDATOR = jsonschema.Draft202012Validator(TEA_CONFIG_SCHEMA)
+
+
+def _plain(value):
+    # Keep dataclass fields JSON-serializable when they are built from numpy values.
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return [float(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class _ConfigMixin:
+
+    def __post_init__(self):
+        for f in fields(self):
+            setattr(self, f.name, _plain(getattr(self, f.name)))
 
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
+
+@dataclass
+class ScenarioConfig(_ConfigMixin):
+    name: str
+    subscriber_growth_rate: Schedule
+    opex_growth_rate: Schedule
+    discount_rate: float
+
     @staticmethod
     def from_dict(data: Dict[str, Any]):
         return ScenarioConfig(**data)
 
 
 @dataclass
-class FinancialInputsConfig:
+class FinancialInputsConfig(_ConfigMixin):
     starting_subscribers: int
-    subscription_fee: float
-    pay_per_use_fee: float
+    subscription_fee: Schedule
+    pay_per_use_fee: Schedule
     base_opex: float
-    capex: float
+    capex: Schedule
     years: int
     subscription_ratio: float = field(default=1.0)
 
-    def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
-
     @staticmethod
     def from_dict(data: Dict[str, Any]):
         return FinancialInputsConfig(**data)
@@ -42,17 +102,30 @@ class TEAConfig:
     scenario: ScenarioConfig
     financials: FinancialInputsConfig
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "scenario": self.scenario.to_dict(),
+            "financials": self.financials.to_dict()
+        }
+
     def to_json(self, path: str):
         with open(path, "w") as f:
-            json.dump({
-                "scenario": self.scenario.to_dict(),
-                "financials": self.financials.to_dict()
-            }, f, indent=2)
+            json.dump(self.to_dict(), f, indent=2)
 
     @staticmethod
-    def from_json(path: str):
-        with open(path, "r") as f:
-            data = json.load(f)
+    def validate(data: Dict[str, Any]):
+        """Raise `jsonschema.ValidationError` if `data` does not follow `TEA_CONFIG_SCHEMA`."""
+        _VALIDATOR.validate(data)
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]):
+        TEAConfig.validate(data)
         scenario = ScenarioConfig.from_dict(data["scenario"])
         financials = FinancialInputsConfig.from_dict(data["financials"])
         return TEAConfig(scenario, financials)
+
+    @staticmethod
+    def from_json(path: str):
+        with open(path, "r") as f:
+            data = json.load(f)
+        return TEAConfig.from_dict(data)
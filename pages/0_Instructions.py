@@ -23,6 +23,10 @@ Navigate to the **Create or Edit Scenario** page:
 - OPEX Growth Rate *(% per year)*
 - Discount Rate *(% for NPV)*
 
+🗓️ Growth rates, fees and CAPEX can also be **per-year schedules** in a config file,
+e.g. `"subscriber_growth_rate": [50, 30, 20]` for a ramp-up or `"capex": [100000, 0, 50000]`
+for staged investment. A shorter schedule carries its last value forward (CAPEX: zero).
+
 💾 Click **Save Scenario** to export your config.
 """)
 
@@ -50,6 +54,21 @@ Go to the **Compare Scenarios** page:
 st.divider()
 
 # Step 3
+st.header("🧪 Step 3: Run a Design Study")
+st.markdown("""
+Go to the **Design Study** page to explore many variations of a saved scenario at once:
+
+🎛️ Pick a base scenario, the inputs to vary with their ranges, and a sampling method
+(full grid, Latin hypercube or Sobol sequence).
+
+⏳ Studies run in the background: progress and partial results update live, you can
+cancel a study, and you can keep working on other pages while it runs.
+""")
+
+# Divider
+st.divider()
+
+# Step 4
 st.header("💡 Example Use Cases")
 st.markdown("""
 This tool is designed to support:
@@ -2,6 +2,8 @@ import os
 import streamlit as st
 from calculations import Scenario, FinancialInputs, TEACalculator
 from models import TEAConfig, ScenarioConfig, FinancialInputsConfig
+from scenario_index import load_index, INDEX_FILE
+from boundary import find_boundary
 import pandas as pd
 
 from plots import (
@@ -10,6 +12,7 @@ from plots import (
     plot_cash_flow,
     plot_breakeven,
     plot_reverse_pricing,
+    plot_boundary,
     # plot_annual_profit,
     # plot_annual_revenue,
     plot_user_model_split
@@ -45,6 +48,24 @@ with st.expander("ℹ️ What do these values mean?"):
 
 
 
+def schedule_input(label, value, key, widget, **kwargs):
+    """Scalar widget for constant values, comma-separated text input for per-year schedules."""
+    if isinstance(value, list):
+        text = st.sidebar.text_input(
+            f"{label} – per-year schedule", ", ".join(f"{v:g}" for v in value), key=key,
+            help="One value per year, comma-separated. The last value carries over to the remaining years."
+        )
+        previous = st.session_state.get(f"{key}_schedule", value)
+        try:
+            schedule = [float(v) for v in text.split(",") if v.strip()]
+        except ValueError:
+            st.sidebar.error(f"❌ {label}: enter numbers separated by commas. Using the previous schedule.")
+            return previous
+        st.session_state[f"{key}_schedule"] = schedule or value
+        return schedule or value
+    return widget(label, value=float(value), key=key, **kwargs)
+
+
 # --- Sidebar ---
 st.sidebar.header("📥 Input Parameters")
 st.sidebar.markdown("**ℹ️ All values are annual unless stated otherwise.**")
@@ -58,8 +79,8 @@ years = st.sidebar.slider("Years to project", 3, 10, value=fin.years, key="years
 
 
 starting_subs = st.sidebar.number_input("📦 Starting Subscribers (Year 0)", value=fin.starting_subscribers, key="subs")
-sub_fee = st.sidebar.number_input("💶 Subscription Fee (€ / subscriber / year)", value=fin.subscription_fee, key="sub_fee")
-ppu_fee = st.sidebar.number_input("💶 Pay-per-use Revenue (€ / subscriber /year)", value=fin.pay_per_use_fee, key="ppu_fee")
+sub_fee = schedule_input("💶 Subscription Fee (€ / subscriber / year)", fin.subscription_fee, "sub_fee", st.sidebar.number_input)
+ppu_fee = schedule_input("💶 Pay-per-use Revenue (€ / subscriber /year)", fin.pay_per_use_fee, "ppu_fee", st.sidebar.number_input)
 subscription_ratio = st.sidebar.slider(
     "🧮 % of Subscribers on Subscription Model",
     0, 100,
@@ -68,20 +89,20 @@ subscription_ratio = st.sidebar.slider(
     key="sub_ratio",
     help="What percentage of users are charged via subscription vs. pay-per-use."
 )
-capex = st.sidebar.number_input("🏗️ CAPEX (one-time investment, €)", value=fin.capex, key="capex")
+capex = schedule_input("🏗️ CAPEX (one-time investment, €)", fin.capex, "capex", st.sidebar.number_input)
 base_opex = st.sidebar.number_input("💸 Base OPEX (€ / year)", value=fin.base_opex, key="opex")
 
 st.sidebar.markdown("---")
 st.sidebar.subheader("📈 Growth & Financial Assumptions")
 
-sub_growth = st.sidebar.slider(
-    "Subscriber Growth Rate (%)", 0.0, 50.0,
-    float(scn.subscriber_growth_rate), step=0.1, key="sub_growth",
+sub_growth = schedule_input(
+    "Subscriber Growth Rate (%)", scn.subscriber_growth_rate, "sub_growth", st.sidebar.slider,
+    min_value=0.0, max_value=50.0, step=0.1,
     help="Annual % growth in subscriber count."
 )
-opex_growth = st.sidebar.slider(
-    "OPEX Growth Rate (%)", 0.0, 20.0,
-    float(scn.opex_growth_rate), step=0.1, key="opex_growth",
+opex_growth = schedule_input(
+    "OPEX Growth Rate (%)", scn.opex_growth_rate, "opex_growth", st.sidebar.slider,
+    min_value=0.0, max_value=20.0, step=0.1,
     help="Annual % increase in operating expenses."
 )
 discount = st.sidebar.slider(
@@ -112,8 +133,9 @@ subscribers = calc.project_subscribers()
 subscription_users = [int(s * inputs.subscription_ratio) for s in subscribers]
 ppu_users = [s - sub for s, sub in zip(subscribers, subscription_users)]
 
-subscription_revenue = [n * sub_fee for n in subscription_users]
-ppu_revenue = [n * ppu_fee for n in ppu_users]
+sub_fees, ppu_fees = calc.project_fees()
+subscription_revenue = [n * f for n, f in zip(subscription_users, sub_fees)]
+ppu_revenue = [n * f for n, f in zip(ppu_users, ppu_fees)]
 
 revenues = [s + p for s, p in zip(subscription_revenue, ppu_revenue)]
 opex = calc.project_opex()
@@ -172,6 +194,119 @@ df = pd.DataFrame({
 numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns
 st.dataframe(df.style.format({col: "{:,.2f}" for col in numeric_cols}), use_container_width=True)
 
+# --- Sensitivities ---
+with st.expander("📐 NPV Sensitivities (exact partial derivatives)"):
+    sensitivities = calc.calculate_sensitivities()["npv"]
+    units = {
+        "starting_subscribers": "€ per subscriber",
+        "subscriber_growth_rate": "€ per % point",
+        "opex_growth_rate": "€ per % point",
+        "discount_rate": "€ per % point",
+        "subscription_fee": "€ per € of fee",
+        "pay_per_use_fee": "€ per € of fee",
+        "base_opex": "€ per € of OPEX",
+        "capex": "€ per € of CAPEX",
+        "subscription_ratio": "€ per unit of ratio",
+    }
+    st.dataframe(pd.DataFrame({
+        "Input": list(sensitivities.keys()),
+        "∂NPV / ∂Input": list(sensitivities.values()),
+        "Unit": [units[name] for name in sensitivities],
+    }).style.format({"∂NPV / ∂Input": "{:,.2f}"}), use_container_width=True)
+
+# --- Similar Saved Scenarios ---
+@st.cache_resource
+def get_scenario_index(directory):
+    return load_index(directory)
+
+
+scenario_index = get_scenario_index(config_dir)
+index_path = os.path.join(config_dir, INDEX_FILE)
+if scenario_index.sync_directory(config_dir):
+    scenario_index.save(index_path)
+
+current_config = TEAConfig(
+    scenario=ScenarioConfig(
+        name=scenario.name,
+        subscriber_growth_rate=sub_growth,
+        opex_growth_rate=opex_growth,
+        discount_rate=discount
+    ),
+    financials=FinancialInputsConfig(
+        starting_subscribers=starting_subs,
+        subscription_fee=sub_fee,
+        pay_per_use_fee=ppu_fee,
+        base_opex=base_opex,
+        capex=capex,
+        years=years,
+        subscription_ratio=subscription_ratio / 100.0
+    )
+)
+
+with st.expander("🔎 Similar Saved Scenarios"):
+    neighbours = scenario_index.query(current_config, k=5)
+    if neighbours:
+        st.dataframe(pd.DataFrame({
+            "Config": [key for key, _, _ in neighbours],
+            "Distance": [d for _, d, _ in neighbours],
+            "NPV (€)": [m["npv"] for _, _, m in neighbours],
+            "ROI": [m["roi"] for _, _, m in neighbours],
+            "Break-even Year": [int(m["breakeven_year"]) for _, _, m in neighbours],
+        }).style.format({"Distance": "{:.2f}", "NPV (€)": "{:,.2f}", "ROI": "{:.2f}"}), use_container_width=True)
+        estimate = scenario_index.interpolate(current_config, k=5)
+        st.caption(f"Estimated from neighbours: NPV ≈ {estimate['npv']:,.0f} € (computed: {npv:,.0f} €)")
+    else:
+        st.info("No saved scenarios indexed yet.")
+
+# --- Decision Boundary ---
+BOUNDARY_FIELDS = {
+    "subscription_fee": "Subscription Fee (€)",
+    "pay_per_use_fee": "Pay-per-Use Fee (€)",
+    "subscriber_growth_rate": "Subscriber Growth (%)",
+    "opex_growth_rate": "OPEX Growth (%)",
+    "starting_subscribers": "Starting Subscribers",
+    "base_opex": "Base OPEX (€)",
+    "capex": "CAPEX (€)",
+}
+
+
+def boundary_range(name, flat):
+    value = flat[name]
+    value = float(sum(value) / len(value)) if isinstance(value, list) else float(value)
+    if name.endswith("growth_rate"):
+        return max(value - 30.0, -90.0), value + 30.0
+    if value == 0 and name != "starting_subscribers":
+        # e.g. no CAPEX yet: scale the range to the running costs instead
+        value = flat["base_opex"] * 2.5
+    return 0.0, max(2 * value, 1.0)
+
+
+@st.cache_data(show_spinner=False)
+def get_boundary(config_dict, bounds, target):
+    return find_boundary(TEAConfig.from_dict(config_dict), bounds, target=target, tolerance=0.002)
+
+
+with st.expander("🧭 Decision Boundary"):
+    col_x, col_y, col_target = st.columns(3)
+    x_field = col_x.selectbox("X axis", list(BOUNDARY_FIELDS), format_func=BOUNDARY_FIELDS.get, index=0)
+    y_field = col_y.selectbox("Y axis", list(BOUNDARY_FIELDS), format_func=BOUNDARY_FIELDS.get, index=2)
+    target = col_target.radio("Boundary", ["npv", "breakeven_year"],
+                              format_func={"npv": "NPV = 0", "breakeven_year": "Break-even year"}.get)
+    if x_field == y_field:
+        st.info("Pick two different inputs.")
+    else:
+        config_dict = current_config.to_dict()
+        flat = {**config_dict["scenario"], **config_dict["financials"]}
+        bounds = {name: boundary_range(name, flat) for name in (x_field, y_field)}
+        boundary = get_boundary(config_dict, bounds, target)
+        fig = plot_boundary([BOUNDARY_FIELDS[x_field], BOUNDARY_FIELDS[y_field]], boundary.by_label())
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption(
+            f"{boundary.evaluations:,} evaluations instead of {boundary.grid_evaluations:,} for a full grid; "
+            f"points are within ±{boundary.tolerance[x_field]:,.2f} / ±{boundary.tolerance[y_field]:,.2f} "
+            "of the true boundary. Varied inputs are held constant across years."
+        )
+
 # --- Save Options ---
 st.sidebar.markdown("---")
 st.sidebar.header("💾 Save Scenario Options")
@@ -202,6 +337,8 @@ with st.sidebar.form("save_as_new_form"):
         )
         save_path = os.path.join(config_dir, f"{new_config_name}.json")
         new_config.to_json(save_path)
+        scenario_index.add(new_config_name, new_config, os.path.getmtime(save_path))
+        scenario_index.save(index_path)
         st.success(f"✅ Saved as '{new_config_name}.json'")
 
 # Option B: Overwrite Current
@@ -229,6 +366,8 @@ with st.sidebar.form("update_current_form"):
         )
         update_path = os.path.join(config_dir, selected_file)
         updated_config.to_json(update_path)
+        scenario_index.add(selected_file.replace(".json", ""), updated_config, os.path.getmtime(update_path))
+        scenario_index.save(index_path)
         st.success(f"✅ Updated '{selected_file}'")
 
 
@@ -6,16 +6,17 @@ import streamlit as st
 
 from calculations import Scenario, FinancialInputs, TEACalculator
 from models import TEAConfig
+from portfolio import Portfolio
 from plots import (
     plot_cash_flow,
     plot_reverse_pricing,
     plot_annual_profit,
     plot_annual_revenue,
-    plot_capex_vs_cumulative_profit
+    plot_capex_vs_cumulative_profit,
+    plot_breakeven_comparison,
+    plot_reverse_pricing_comparison
 )
 
-import plotly.graph_objects as go
-
 st.set_page_config(page_title="Techno-Economic Analysis", layout="wide")
 st.title("📊 Compare Saved Scenarios")
 
@@ -27,14 +28,18 @@ selected_files = st.sidebar.multiselect("📂 Select Scenario Configs", config_f
 # --- Process selected scenarios ---
 scenario_results = {}
 tags = {}
+configs = {}
 
 for file in selected_files:
     config_path = os.path.join(config_dir, file)
     loaded = TEAConfig.from_json(config_path)
     scenario_config = loaded.scenario
     name = file.replace(".json", "")
-    tag = f"{scenario_config.name} ({scenario_config.subscriber_growth_rate:.0f}% subs/yr)"
+    growth = scenario_config.subscriber_growth_rate
+    growth_label = f"{growth:.0f}%" if not isinstance(growth, list) else f"{growth[0]:.0f}–{growth[-1]:.0f}%"
+    tag = f"{scenario_config.name} ({growth_label} subs/yr)"
     tags[name] = tag
+    configs[name] = loaded
     scn = Scenario(**loaded.scenario.to_dict())
     fin = FinancialInputs(**loaded.financials.to_dict())
     calc = TEACalculator(scn, fin)
@@ -54,7 +59,8 @@ for file in selected_files:
         "npv": calc.calculate_npv(),
         "roi": calc.calculate_roi(),
         "breakeven_year": calc.calculate_breakeven_year(),
-        "reverse_fee": [o / max(s, 1) for o, s in zip(opex, subs)]
+        "reverse_fee": [o / max(s, 1) for o, s in zip(opex, subs)],
+        "capex": sum(calc.project_capex())
     }
 
     scenario_results[name] = result
@@ -71,32 +77,12 @@ if scenario_results:
     # --- Break-even Year Comparison ---
     st.subheader("📌 Break-even Year Comparison")
 
-    fig = go.Figure()
-    for name, res in scenario_results.items():
-        breakeven = res["breakeven_year"]
-        fig.add_trace(go.Bar(
-            x=[name],
-            y=[breakeven if breakeven != -1 else None],
-            text=[f"{breakeven}" if breakeven != -1 else "Not Reached"],
-            textposition="auto",
-            name=name
-        ))
-
-    fig.update_layout(
-        title="Break-even Year by Scenario",
-        xaxis_title="Scenario",
-        yaxis_title="Year",
-        yaxis=dict(dtick=1),
-        showlegend=False
-    )
-    st.plotly_chart(fig, use_container_width=True)
+    breakevens = {name: res["breakeven_year"] for name, res in scenario_results.items()}
+    st.plotly_chart(plot_breakeven_comparison(breakevens), use_container_width=True)
 
     st.subheader("📉 Reverse Pricing Comparison")
-    fig = go.Figure()
-    for name, res in scenario_results.items():
-        fig.add_trace(go.Scatter(x=year_labels, y=res["reverse_fee"], mode="lines+markers", name=name))
-    fig.update_layout(title="Reverse Pricing (€/subscriber)", xaxis_title="Year", yaxis_title="Required Fee")
-    st.plotly_chart(fig, use_container_width=True)
+    reverse_fees = {name: res["reverse_fee"] for name, res in scenario_results.items()}
+    st.plotly_chart(plot_reverse_pricing_comparison(year_labels, reverse_fees), use_container_width=True)
 
     # --- Annual Trends ---
     st.subheader("📈 Total Revenue Comparison")
@@ -111,12 +97,40 @@ if scenario_results:
     # --- CAPEX vs Cumulative Profit ---
     st.subheader("📦 CAPEX vs Cumulative Profit")
     for name, res in scenario_results.items():
-        capex = TEAConfig.from_json(os.path.join(config_dir, name + ".json")).financials.capex
-        fig = plot_capex_vs_cumulative_profit(res["years"], res["cum_cash_flow"], capex, title=f"{name} – CAPEX vs Cumulative Profit")
+        fig = plot_capex_vs_cumulative_profit(res["years"], res["cum_cash_flow"], res["capex"], title=f"{name} – CAPEX vs Cumulative Profit")
         st.plotly_chart(fig, use_container_width=True)
 
 
 
+    # --- Consolidated Portfolio ---
+    st.subheader("🏢 Consolidated Portfolio")
+    with st.expander("Treat the selected scenarios as business units of one portfolio"):
+        portfolio_discount = st.slider("Portfolio Discount Rate (%)", 0.0, 15.0, 10.0, step=0.1, key="portfolio_discount")
+        offset_cols = st.columns(min(len(configs), 4))
+        offsets = {
+            name: offset_cols[i % len(offset_cols)].number_input(f"{name}: start year offset", 0, 20, 0, key=f"offset_{name}")
+            for i, name in enumerate(configs)
+        }
+        portfolio = Portfolio(portfolio_discount)
+        portfolio.add_units((name, config, offsets[name]) for name, config in configs.items())
+        consolidated = portfolio.consolidated()
+        portfolio_years = [f"Year {i+1}" for i in range(len(consolidated["profit"]))]
+
+        col1, col2 = st.columns(2)
+        col1.metric("Portfolio NPV (€)", f"{consolidated['npv']:,.2f} €")
+        col2.metric("Portfolio Break-even Year", consolidated["breakeven_year"] if consolidated["breakeven_year"] != -1 else "Not Reached")
+        st.plotly_chart(
+            plot_cash_flow(portfolio_years, {"Portfolio": consolidated["cum_cash_flow"]}, title="Consolidated Cumulative Cash Flow"),
+            use_container_width=True
+        )
+        shares = portfolio.contribution_shares()
+        st.dataframe(pd.DataFrame({
+            "Unit": list(shares.keys()),
+            "Start Offset (years)": [offsets[name] for name in shares],
+            "NPV Contribution (€)": [portfolio.unit_npv[name] for name in shares],
+            "Share of NPV": list(shares.values()),
+        }).style.format({"NPV Contribution (€)": "{:,.2f}", "Share of NPV": "{:.1%}"}), use_container_width=True)
+
     # --- Metrics Summary ---
     st.subheader("📋 Scenario Summary Metrics")
     metrics_df = pd.DataFrame({
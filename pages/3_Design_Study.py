@@ -0,0 +1,157 @@
+# pages/3_Design_Study.py
+import os
+import uuid
+import pandas as pd
+import streamlit as st
+
+from bundles import NUMERIC_FIELDS
+from doe import DEFAULT_CHUNK_SIZE, DISTRIBUTIONS, METHODS, Design, Dimension, study_design
+from jobs import DONE, FAILED, CANCELLED, JobQueueFull, get_scheduler
+from models import TEAConfig
+
+st.set_page_config(page_title="Design Study", layout="wide")
+st.title("🧪 Design Study")
+st.caption("Evaluate thousands to millions of scenario variations in the background. "
+           "You can keep using the app while a study runs; results appear here when it finishes.")
+
+scheduler = get_scheduler()
+st.session_state.setdefault("job_ids", [])
+# Identifies this session to the scheduler: a study shared with other sessions keeps
+# running for them when this one cancels it.
+st.session_state.setdefault("session_id", uuid.uuid4().hex)
+# Finished results are copied into the session, so they outlive the scheduler's job history.
+st.session_state.setdefault("study_results", {})
+
+
+def run_study(ctx, base_dict, dimensions, method, points, levels):
+    # Runs on a worker thread; only `ctx` may be used to talk back to the page.
+    design = Design([Dimension.from_dict(name, spec) for name, spec in dimensions.items()],
+                    method=method, points=points, levels=levels)
+    return study_design(
+        TEAConfig.from_dict(base_dict), design,
+        chunk_size=min(DEFAULT_CHUNK_SIZE, 16_384),
+        on_progress=lambda done, total, summary: ctx.report(done, total, partial=summary,
+                                                            message=f"{done:,} / {total:,} scenarios"),
+    )
+
+
+# --- Study definition ---
+config_dir = "configs"
+config_files = sorted(f for f in os.listdir(config_dir) if f.endswith(".json"))
+base_file = st.sidebar.selectbox("📂 Base Scenario", config_files)
+base = TEAConfig.from_json(os.path.join(config_dir, base_file))
+method = st.sidebar.selectbox("🎲 Sampling", METHODS, index=METHODS.index("sobol"),
+                              format_func={"grid": "Full grid", "lhs": "Latin hypercube", "sobol": "Sobol sequence"}.get)
+if method == "grid":
+    levels = st.sidebar.number_input("Levels per input", min_value=2, max_value=200, value=10)
+    points = None
+else:
+    levels = 5
+    points = st.sidebar.number_input("Scenarios", min_value=1_000, max_value=50_000_000, value=100_000, step=10_000)
+
+st.subheader("Inputs to vary")
+fin = base.financials
+default_rows = pd.DataFrame([
+    {"Field": "subscription_fee", "Low": 0.5 * float(pd.Series(fin.subscription_fee).mean()),
+     "High": 1.5 * float(pd.Series(fin.subscription_fee).mean()), "Distribution": "uniform"},
+    {"Field": "subscriber_growth_rate", "Low": 0.0, "High": 50.0, "Distribution": "uniform"},
+])
+rows = st.data_editor(
+    default_rows,
+    num_rows="dynamic",
+    use_container_width=True,
+    column_config={
+        "Field": st.column_config.SelectboxColumn(options=[f for f in NUMERIC_FIELDS if f != "years"], required=True),
+        "Distribution": st.column_config.SelectboxColumn(
+            options=[d for d in DISTRIBUTIONS if d not in ("choice", "triangular")], required=True),
+    },
+    key="design_rows",
+)
+
+dimensions = {}
+try:
+    for row in rows.dropna(subset=["Field"]).itertuples():
+        dimension = Dimension(row.Field, float(row.Low), float(row.High), row.Distribution)
+        dimensions[dimension.name] = {"low": dimension.low, "high": dimension.high, "distribution": dimension.distribution}
+    if not dimensions:
+        raise ValueError("Add at least one input to vary")
+    size = len(Design([Dimension.from_dict(n, s) for n, s in dimensions.items()], method=method, points=points, levels=levels))
+except ValueError as e:
+    st.error(f"❌ {e}")
+    st.stop()
+
+st.caption(f"{size:,} scenarios on top of **{base.scenario.name}**.")
+if st.button("▶️ Start Study"):
+    try:
+        job = scheduler.submit(run_study, base.to_dict(), dimensions, method, points, levels,
+                               label=f"{method} study of {base_file} ({size:,} scenarios)",
+                               subscriber=st.session_state["session_id"])
+    except JobQueueFull as e:
+        st.warning(f"⏳ Too many studies waiting, try again shortly ({e}).")
+    else:
+        if job.id in st.session_state["job_ids"]:
+            st.info("This study was already submitted; showing its progress.")
+        else:
+            st.session_state["job_ids"].append(job.id)
+        st.session_state["study_job"] = job.id
+
+
+def show_summary(summary):
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Scenarios", f"{summary['evaluated']:,}")
+    col2.metric("Mean NPV (€)", f"{summary['npv']['mean']:,.0f}")
+    reached = sum(c for y, c in summary["breakeven_years"].items() if y != "-1")
+    col3.metric("Break-even reached", f"{reached / max(summary['evaluated'], 1):.1%}")
+    st.markdown("**Best scenarios by NPV**")
+    st.dataframe(pd.DataFrame(summary["top"]), use_container_width=True)
+
+
+# --- Progress and results ---
+@st.fragment(run_every="1s")
+def study_progress():
+    job_id = st.session_state.get("study_job")
+    job = scheduler.get(job_id)
+    if job is not None and job.status == DONE:
+        st.session_state["study_results"][job.id] = (job.label, job.elapsed, job.result)
+    if job is None or job.status == DONE:
+        if job_id in st.session_state["study_results"]:
+            label, elapsed, result = st.session_state["study_results"][job_id]
+            st.subheader(f"📋 {label}")
+            st.success(f"✅ Finished in {elapsed:.1f}s")
+            show_summary(result)
+        return
+    st.subheader(f"📋 {job.label}")
+    if job.active:
+        st.progress(job.progress, text=job.message or job.status.capitalize())
+        if st.button("⏹️ Cancel", key="cancel_study"):
+            if not scheduler.cancel(job.id, subscriber=st.session_state["session_id"]) and job.active:
+                # Other sessions still want this study; stop following it here only.
+                st.session_state["job_ids"].remove(job.id)
+                del st.session_state["study_job"]
+                st.rerun()
+        if job.partial:
+            st.caption("Partial results so far:")
+            show_summary(job.partial)
+    elif job.status == CANCELLED:
+        st.warning("Study cancelled.")
+    elif job.status == FAILED:
+        st.error(f"❌ Study failed: {job.error}")
+
+
+study_progress()
+
+with st.sidebar.expander("⚙️ Background Jobs"):
+    mine = [job for job in (scheduler.get(i) for i in st.session_state["job_ids"]) if job is not None]
+    if mine:
+        st.dataframe(pd.DataFrame({
+            "Job": [job.label for job in mine],
+            "Status": [job.status for job in mine],
+            "Progress": [f"{job.progress:.0%}" for job in mine],
+        }), use_container_width=True, hide_index=True)
+        labels = {job.id: job.label for job in mine}
+        picked = st.selectbox("Show job", list(labels), format_func=labels.get, index=len(mine) - 1)
+        if st.button("Show"):
+            st.session_state["study_job"] = picked
+            st.rerun()
+    else:
+        st.caption("No jobs started in this session.")
@@ -1,165 +1,267 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Sequence, Tuple
 
+import numpy as np
 import plotly.graph_objects as go
-from typing import List, Dict
+import plotly.io as pio
+
+# Figures are built from a per-chart layout template that is validated once; only the
+# trace data changes between reruns. Finished figures (and their JSON) are cached by a
+# hash of their content, so an unchanged chart costs a dictionary lookup and an
+# unvalidated `go.Figure` built from the cached spec. Every call returns its own figure,
+# so callers may mutate it. The caches are shared by all sessions' script threads.
+FIGURE_CACHE_SIZE = 256
+
+_layouts: Dict[Tuple, Dict[str, Any]] = {}
+_figures: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_serialized: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _values(values) -> np.ndarray:
+    # NumPy arrays are sent to the browser as compact typed arrays. Always a copy: cached
+    # figures must not change when the caller later modifies its own array.
+    return np.array(values, dtype=float)
+
+
+def _digest(key: Tuple, traces: List[Dict[str, Any]]) -> str:
+    h = hashlib.blake2b(repr(key).encode(), digest_size=16)
+    for trace in traces:
+        for name, value in sorted(trace.items()):
+            h.update(name.encode())
+            if isinstance(value, np.ndarray):
+                h.update(str(value.dtype).encode() + str(value.shape).encode())
+                h.update(np.ascontiguousarray(value).tobytes())
+            else:
+                h.update(repr(value).encode())
+    return h.hexdigest()
+
+
+def _lookup(cache: OrderedDict, key: str):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _remember(cache: OrderedDict, key: str, value):
+    with _cache_lock:
+        cache[key] = value
+        if len(cache) > FIGURE_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _figure(key: Tuple, layout: Callable[[], Dict[str, Any]], traces: List[Dict[str, Any]]) -> go.Figure:
+    digest = _digest(key, traces)
+    spec = _lookup(_figures, digest)
+    if spec is None:
+        with _cache_lock:
+            if key not in _layouts:
+                _layouts[key] = go.Layout(**layout()).to_plotly_json()
+            spec = {"data": traces, "layout": copy.deepcopy(_layouts[key])}
+        _remember(_figures, digest, spec)
+    # Layout and trace types are fixed per template, so re-validating them on every
+    # rerun is wasted work. The constructor copies `spec`, leaving the cached one intact.
+    fig = go.Figure(spec, _validate=False)
+    fig._content_hash = digest
+    return fig
+
+
+def serialize_figure(fig: go.Figure) -> str:
+    """
+    Plotly JSON for `fig`, cached by content hash for figures built in this module.
+
+    The cached JSON reflects the figure as built; serialize a figure you have modified
+    without the hash, e.g. `pio.to_json(fig)`.
+    """
+    digest = getattr(fig, "_content_hash", None)
+    if digest is None:
+        return pio.to_json(fig, validate=False)
+    json = _lookup(_serialized, digest)
+    if json is None:
+        json = pio.to_json(fig, validate=False)
+        _remember(_serialized, digest, json)
+    return json
+
+
+def _line_traces(series_by_name: Dict[str, Sequence[float]], x: Sequence) -> List[Dict[str, Any]]:
+    x = list(x)
+    return [
+        {"type": "scatter", "x": x, "y": _values(values), "mode": "lines+markers", "name": name}
+        for name, values in series_by_name.items()
+    ]
 
 
 def plot_revenue_breakdown(years: List[int], subscription_rev: List[float], pay_per_use_rev: List[float], title: str = "Revenue Breakdown"):
-    fig = go.Figure()
-    fig.add_trace(go.Bar(x=years, y=subscription_rev, name="Subscription Revenue"))
-    fig.add_trace(go.Bar(x=years, y=pay_per_use_rev, name="Pay-per-Use Revenue"))
-    fig.update_layout(
-        barmode='stack',
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="Revenue (€)"
+    years = list(years)
+    return _figure(
+        ("revenue_breakdown", title),
+        lambda: dict(barmode='stack', title=title, xaxis_title="Year", yaxis_title="Revenue (€)"),
+        [
+            {"type": "bar", "x": years, "y": _values(subscription_rev), "name": "Subscription Revenue"},
+            {"type": "bar", "x": years, "y": _values(pay_per_use_rev), "name": "Pay-per-Use Revenue"},
+        ],
     )
-    return fig
 
 
 def plot_opex(years: List[int], opex: List[float], title: str = "OPEX Over Time"):
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=years, y=opex, mode='lines+markers', name="OPEX"))
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="OPEX (€)"
+    return _figure(
+        ("opex", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="OPEX (€)"),
+        _line_traces({"OPEX": opex}, years),
     )
-    return fig
 
 
 def plot_cash_flow(years: List[int], cash_flows_by_scenario: Dict[str, List[float]], title: str = "Cumulative Cash Flow"):
-    fig = go.Figure()
-    for scenario_name, cash_flow in cash_flows_by_scenario.items():
-        fig.add_trace(go.Scatter(x=years, y=cash_flow, mode='lines+markers', name=scenario_name))
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="Cumulative Cash Flow (€)"
+    return _figure(
+        ("cash_flow", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="Cumulative Cash Flow (€)"),
+        _line_traces(cash_flows_by_scenario, years),
     )
-    return fig
 
 
 def plot_breakeven(cumulative_cash_flow: List[float], years: List[int], title: str = "Breakeven Analysis"):
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=years, y=cumulative_cash_flow, mode='lines+markers', name="Cumulative Cash Flow"))
+    traces = _line_traces({"Cumulative Cash Flow": cumulative_cash_flow}, years)
 
     # Mark breakeven point
     for i, val in enumerate(cumulative_cash_flow):
         if val >= 0:
-            fig.add_trace(go.Scatter(
-                x=[years[i]], y=[val],
-                mode='markers+text',
-                name="Break-even",
-                marker=dict(size=12, color="red"),
-                text=["Break-even"],
-                textposition="top center"
-            ))
+            traces.append({
+                "type": "scatter",
+                "x": [years[i]], "y": _values([val]),
+                "mode": 'markers+text',
+                "name": "Break-even",
+                "marker": dict(size=12, color="red"),
+                "text": ["Break-even"],
+                "textposition": "top center",
+            })
             break
 
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="Cumulative Cash Flow (€)",
-        showlegend=True
+    return _figure(
+        ("breakeven", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="Cumulative Cash Flow (€)", showlegend=True),
+        traces,
     )
-    return fig
 
 
 def plot_reverse_pricing(years: List[int], required_fees: List[float], title: str = "Reverse Pricing Curve"):
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=years, y=required_fees, mode='lines+markers', name="Required Fee"))
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="€ per Subscriber to Cover OPEX"
+    return _figure(
+        ("reverse_pricing", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="€ per Subscriber to Cover OPEX"),
+        _line_traces({"Required Fee": required_fees}, years),
+    )
+
+
+def plot_reverse_pricing_comparison(years: List[str], fees_by_scenario: Dict[str, List[float]], title: str = "Reverse Pricing (€/subscriber)"):
+    return _figure(
+        ("reverse_pricing_comparison", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="Required Fee"),
+        _line_traces(fees_by_scenario, years),
+    )
+
+
+def plot_breakeven_comparison(breakeven_by_scenario: Dict[str, int], title: str = "Break-even Year by Scenario"):
+    traces = [
+        {
+            "type": "bar",
+            "x": [name],
+            "y": _values([breakeven if breakeven != -1 else np.nan]),
+            "text": [f"{breakeven}" if breakeven != -1 else "Not Reached"],
+            "textposition": "auto",
+            "name": name,
+        }
+        for name, breakeven in breakeven_by_scenario.items()
+    ]
+    return _figure(
+        ("breakeven_comparison", title),
+        lambda: dict(title=title, xaxis_title="Scenario", yaxis_title="Year", yaxis=dict(dtick=1), showlegend=False),
+        traces,
     )
-    return fig
 
 
 def plot_annual_profit(years: List[int], profit_by_scenario: Dict[str, List[float]], title: str = "Annual Profit Comparison"):
-    fig = go.Figure()
-    for scenario_name, profits in profit_by_scenario.items():
-        fig.add_trace(go.Scatter(x=years, y=profits, mode='lines+markers', name=scenario_name))
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="Profit (€)"
+    return _figure(
+        ("annual_profit", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="Profit (€)"),
+        _line_traces(profit_by_scenario, years),
     )
-    return fig
 
 
 def plot_annual_revenue(years: List[int], revenue_by_scenario: Dict[str, List[float]], title: str = "Total Revenue Comparison"):
-    fig = go.Figure()
-    for scenario_name, revenues in revenue_by_scenario.items():
-        fig.add_trace(go.Scatter(x=years, y=revenues, mode='lines+markers', name=scenario_name))
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="Revenue (€)"
+    return _figure(
+        ("annual_revenue", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="Revenue (€)"),
+        _line_traces(revenue_by_scenario, years),
     )
-    return fig
 
 
 def plot_profit_margin(years: List[int], margin_by_scenario: Dict[str, List[float]], title: str = "Profit Margin Comparison"):
-    fig = go.Figure()
-    for scenario_name, margins in margin_by_scenario.items():
-        fig.add_trace(go.Scatter(x=years, y=margins, mode='lines+markers', name=scenario_name))
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="Profit Margin (%)"
+    return _figure(
+        ("profit_margin", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="Profit Margin (%)"),
+        _line_traces(margin_by_scenario, years),
     )
-    return fig
 
 
 def plot_capex_vs_cumulative_profit(years: List[str], cum_profit: List[float], capex: float, title: str = "CAPEX vs Cumulative Profit"):
-    fig = go.Figure()
-
-    # Bar for CAPEX (shown only at Year 0)
-    fig.add_trace(go.Bar(
-        x=[years[0]],
-        y=[capex],
-        name="CAPEX",
-        marker_color="indianred"
-    ))
-
-    # Line for cumulative profit
-    fig.add_trace(go.Scatter(
-        x=years,
-        y=cum_profit,
-        mode="lines+markers",
-        name="Cumulative Profit",
-        line=dict(color="seagreen")
-    ))
-
-    fig.update_layout(
-        title=title,
-        xaxis_title="Year",
-        yaxis_title="€",
-        barmode='group'
+    years = list(years)
+    traces = [
+        # Bar for CAPEX (shown only at Year 0)
+        {"type": "bar", "x": [years[0]], "y": _values([capex]), "name": "CAPEX", "marker": dict(color="indianred")},
+        # Line for cumulative profit
+        {
+            "type": "scatter",
+            "x": years,
+            "y": _values(cum_profit),
+            "mode": "lines+markers",
+            "name": "Cumulative Profit",
+            "line": dict(color="seagreen"),
+        },
+    ]
+    return _figure(
+        ("capex_vs_cumulative_profit", title),
+        lambda: dict(title=title, xaxis_title="Year", yaxis_title="€", barmode='group'),
+        traces,
     )
-    return fig
 
 
 def plot_user_model_split(year_labels, subscription_users, ppu_users):
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=year_labels,
-        y=subscription_users,
-        name="Subscription Users",
-    ))
-    fig.add_trace(go.Bar(
-        x=year_labels,
-        y=ppu_users,
-        name="Pay-per-Use Users",
-    ))
-
-    fig.update_layout(
-        barmode="stack",
-        title="📊 User Model Split Over Time",
-        xaxis_title="Year",
-        yaxis_title="Number of Users",
-        legend=dict(x=0.01, y=0.99)
+    year_labels = list(year_labels)
+    return _figure(
+        ("user_model_split",),
+        lambda: dict(
+            barmode="stack",
+            title="📊 User Model Split Over Time",
+            xaxis_title="Year",
+            yaxis_title="Number of Users",
+            legend=dict(x=0.01, y=0.99)
+        ),
+        [
+            {"type": "bar", "x": year_labels, "y": _values(subscription_users), "name": "Subscription Users"},
+            {"type": "bar", "x": year_labels, "y": _values(ppu_users), "name": "Pay-per-Use Users"},
+        ],
     )
 
-    return fig
\ No newline at end of file
+
+def plot_boundary(fields: List[str], points_by_contour: Dict[str, np.ndarray], title: str = "Decision Boundary"):
+    """Scatter of boundary points (`(m, 2)` or `(m, 3)` per contour), in 3-D for three fields."""
+    labels = [name[:1].upper() + name[1:].replace("_", " ") for name in fields]
+    if len(fields) == 3:
+        traces = [
+            {"type": "scatter3d", "x": _values(p[:, 0]), "y": _values(p[:, 1]), "z": _values(p[:, 2]),
+             "mode": "markers", "marker": dict(size=2), "name": name}
+            for name, p in points_by_contour.items()
+        ]
+        layout = lambda: dict(title=title, scene=dict(xaxis_title=labels[0], yaxis_title=labels[1], zaxis_title=labels[2]))
+    else:
+        traces = [
+            {"type": "scatter", "x": _values(p[:, 0]), "y": _values(p[:, 1]), "mode": "markers",
+             "marker": dict(size=4), "name": name}
+            for name, p in points_by_contour.items()
+        ]
+        layout = lambda: dict(title=title, xaxis_title=labels[0], yaxis_title=labels[1])
+    return _figure(("boundary", tuple(fields), title), layout, traces)
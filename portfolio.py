@@ -0,0 +1,152 @@
+"""
+Portfolio view over many business units, each with its own `TEAConfig`.
+
+Units may start later than the portfolio (`offset` years). Consolidated series are
+the sum of every unit's shifted series and are maintained as running totals: units
+are evaluated in batches and added into the totals, so memory does not grow with
+the number of units beyond one NPV figure each. Replacing or removing a unit only
+re-evaluates that unit and adjusts the totals by the difference.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from batch import BatchInputs, evaluate_batch
+from models import TEAConfig
+
+SERIES = ("subscribers", "revenues", "opex", "capex", "profit")
+UnitSpec = Tuple[str, TEAConfig, int]
+
+
+class Portfolio:
+    """
+    Running consolidation of business units.
+
+    All portfolio-level discounting uses `discount_rate` (in %, like `ScenarioConfig`),
+    so unit NPVs add up to the consolidated NPV and contribution shares sum to one.
+    With `incremental=False` unit configs are not kept, which saves memory for one-shot
+    aggregation but means units can no longer be replaced or removed.
+    """
+
+    def __init__(self, discount_rate: float, chunk_size: int = 1024, incremental: bool = True):
+        self.discount_rate = discount_rate
+        self.chunk_size = chunk_size
+        self.incremental = incremental
+        self.totals: Dict[str, np.ndarray] = {name: np.zeros(0) for name in SERIES}
+        self.unit_npv: Dict[str, float] = {}
+        self._units: Dict[str, Tuple[TEAConfig, int]] = {}
+        # Number of units whose last year is at each index; the totals are trimmed to the
+        # last year any unit still covers.
+        self._last_years = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.unit_npv)
+
+    # --- updates ---
+
+    def _apply(self, configs: Sequence[TEAConfig], offsets: np.ndarray, sign: float) -> np.ndarray:
+        # Add (sign=1) or subtract (sign=-1) the units' shifted series; returns their NPVs.
+        return self._fold(evaluate_batch(BatchInputs.from_configs(configs)), offsets, sign)
+
+    def _fold(self, results: Dict[str, np.ndarray], offsets: np.ndarray, sign: float) -> np.ndarray:
+        horizon = results["profit"].shape[1]
+        columns = offsets[:, None] + np.arange(horizon)
+        in_horizon = ~np.isnan(results["profit"])
+        length = int(columns[in_horizon].max(initial=-1)) + 1
+        for name in SERIES:
+            if len(self.totals[name]) < length:
+                self.totals[name] = np.pad(self.totals[name], (0, length - len(self.totals[name])))
+            self.totals[name][:length] += sign * np.bincount(
+                columns[in_horizon], weights=results[name][in_horizon], minlength=length
+            )
+        years = in_horizon.sum(axis=1)
+        last = (offsets + years - 1)[years > 0]
+        if len(self._last_years) < length:
+            self._last_years = np.pad(self._last_years, (0, length - len(self._last_years)))
+        self._last_years[:length] += int(sign) * np.bincount(last, minlength=length)
+        covered = int(np.flatnonzero(self._last_years).max(initial=-1)) + 1
+        if covered < len(self._last_years):
+            self._last_years = self._last_years[:covered]
+            self.totals = {name: values[:covered] for name, values in self.totals.items()}
+        discount = (1 + self.discount_rate / 100) ** (columns + 1)
+        return np.where(in_horizon, results["profit"] / discount, 0.0).sum(axis=1)
+
+    def add_units(self, units: Iterable[UnitSpec]):
+        """Add `(name, config, offset)` units, consuming the iterable `chunk_size` units at a time."""
+        chunk: List[UnitSpec] = []
+        for unit in units:
+            chunk.append(unit)
+            if len(chunk) == self.chunk_size:
+                self._add_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._add_chunk(chunk)
+
+    def _add_chunk(self, chunk: List[UnitSpec]):
+        if self.incremental:
+            # A name repeated within the chunk replaces its earlier entries, as with set_unit.
+            chunk = list({name: (name, config, offset) for name, config, offset in chunk}.values())
+        else:
+            counts = Counter(name for name, _, _ in chunk)
+            repeated = sorted(name for name, count in counts.items() if count > 1 or name in self.unit_npv)
+            if repeated:
+                raise ValueError(f"Duplicate unit name(s): {', '.join(repeated)}")
+        offsets = np.array([offset for _, _, offset in chunk], dtype=int)
+        if (offsets < 0).any():
+            raise ValueError("Unit start offsets must be >= 0")
+        # Evaluate before touching any state, so a bad unit leaves the portfolio unchanged.
+        results = evaluate_batch(BatchInputs.from_configs([config for _, config, _ in chunk]))
+        replaced = [name for name, _, _ in chunk if name in self._units]
+        for name in replaced:
+            self.remove_unit(name)
+        npv = self._fold(results, offsets, 1.0)
+        for (name, config, offset), value in zip(chunk, npv.tolist()):
+            if self.incremental:
+                self._units[name] = (config, offset)
+            self.unit_npv[name] = value
+
+    def set_unit(self, name: str, config: TEAConfig, offset: int = 0):
+        """Add a unit, or replace it by recomputing only its own contribution."""
+        self._add_chunk([(name, config, offset)])
+
+    def remove_unit(self, name: str):
+        if not self.incremental:
+            raise RuntimeError("Units can only be removed from an incremental portfolio")
+        config, offset = self._units.pop(name)
+        self._apply([config], np.array([offset]), -1.0)
+        del self.unit_npv[name]
+
+    # --- results ---
+
+    def consolidated(self) -> Dict[str, object]:
+        """Consolidated per-year series (index 0 = portfolio year 1) and metrics."""
+        result = {name: values.copy() for name, values in self.totals.items()}
+        cum_cash_flow = np.cumsum(self.totals["profit"] - self.totals["capex"])
+        reached = np.flatnonzero(cum_cash_flow >= 0)
+        total_npv = sum(self.unit_npv.values())
+        result.update({
+            "cum_cash_flow": cum_cash_flow,
+            "npv": total_npv,
+            "breakeven_year": int(reached[0]) + 1 if len(reached) else -1,
+        })
+        return result
+
+    def contribution_shares(self) -> Dict[str, float]:
+        """Each unit's share of the consolidated NPV."""
+        total = sum(self.unit_npv.values())
+        return {name: (npv / total if total else float("nan")) for name, npv in self.unit_npv.items()}
+
+
+def aggregate(units: Iterable[UnitSpec], discount_rate: float, chunk_size: int = 1024) -> Dict[str, object]:
+    """
+    One-shot streaming consolidation of any number of `(name, config, offset)` units.
+
+    Units are evaluated `chunk_size` at a time and folded into running totals, so the
+    iterable can be a generator over a bundle or a directory of configs.
+    """
+    portfolio = Portfolio(discount_rate, chunk_size, incremental=False)
+    portfolio.add_units(units)
+    result = portfolio.consolidated()
+    result["shares"] = portfolio.contribution_shares()
+    return result
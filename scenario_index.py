@@ -0,0 +1,344 @@
+"""
+Nearest-neighbour index over saved scenarios and their metrics.
+
+Each scenario is reduced to a feature vector (schedules are averaged over the horizon,
+money and subscriber amounts are log-scaled) and standardized. Points live in a
+KD-tree plus a small brute-force buffer of recent additions, which is folded into the
+tree once it grows past `rebuild_threshold`, so saving a config never pays for a full
+rebuild. An index may be shared by several threads (e.g. Streamlit sessions); updates,
+queries and saving are serialized by a lock.
+"""
+import heapq
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch import BatchInputs, evaluate_batch
+from models import TEAConfig
+
+FEATURES = (
+    "subscriber_growth_rate",
+    "opex_growth_rate",
+    "discount_rate",
+    "starting_subscribers",
+    "subscription_fee",
+    "pay_per_use_fee",
+    "base_opex",
+    "capex",
+    "years",
+    "subscription_ratio",
+)
+LOG_FEATURES = ("starting_subscribers", "subscription_fee", "pay_per_use_fee", "base_opex", "capex")
+METRICS = ("npv", "roi", "breakeven_year")
+INDEX_FILE = ".scenario_index.npz"
+
+Neighbour = Tuple[str, float, Dict[str, float]]
+
+
+def feature_matrix(inputs: BatchInputs) -> np.ndarray:
+    """Raw (unstandardized) feature vectors, one row per scenario in `inputs`."""
+    horizon = np.arange(inputs.horizon)
+    in_horizon = horizon < inputs.years[:, None]
+    in_growth = horizon[:-1] < (inputs.years - 1)[:, None]
+
+    def mean(values, mask):
+        return np.where(mask, values, 0.0).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+
+    columns = {
+        "subscriber_growth_rate": mean(inputs.subscriber_growth_rate, in_growth),
+        "opex_growth_rate": mean(inputs.opex_growth_rate, in_growth),
+        "discount_rate": inputs.discount_rate,
+        "starting_subscribers": inputs.starting_subscribers,
+        "subscription_fee": mean(inputs.subscription_fee, in_horizon),
+        "pay_per_use_fee": mean(inputs.pay_per_use_fee, in_horizon),
+        "base_opex": inputs.base_opex,
+        "capex": np.where(in_horizon, inputs.capex, 0.0).sum(axis=1),
+        "years": inputs.years.astype(float),
+        "subscription_ratio": inputs.subscription_ratio,
+    }
+    return np.column_stack([np.log1p(np.maximum(columns[f], 0)) if f in LOG_FEATURES else columns[f] for f in FEATURES])
+
+
+class _KDTree:
+    """Static KD-tree with leaf buckets; queries skip points whose `alive` flag is off."""
+
+    def __init__(self, points: np.ndarray, ids: np.ndarray, leaf_size: int = 16):
+        self.points = points
+        self.ids = ids
+        self.perm = np.arange(len(points))
+        self.leaf_size = leaf_size
+        self.nodes = []  # [start, stop, dim, split, left, right]; dim == -1 for leaves
+        if len(points):
+            self._build(0, len(points))
+
+    def _build(self, start: int, stop: int) -> int:
+        node = len(self.nodes)
+        self.nodes.append([start, stop, -1, 0.0, -1, -1])
+        if stop - start <= self.leaf_size:
+            return node
+        sub = self.points[self.perm[start:stop]]
+        dim = int(np.argmax(sub.max(axis=0) - sub.min(axis=0)))
+        mid = (start + stop) // 2
+        order = np.argpartition(sub[:, dim], mid - start)
+        self.perm[start:stop] = self.perm[start:stop][order]
+        split = float(self.points[self.perm[mid], dim])
+        left = self._build(start, mid)
+        right = self._build(mid, stop)
+        self.nodes[node][2:] = [dim, split, left, right]
+        return node
+
+    def knn(self, q: np.ndarray, k: int, alive: np.ndarray, heap: List[Tuple[float, int]]):
+        # `heap` holds (-squared distance, id) of the best candidates so far.
+        def visit(node):
+            start, stop, dim, split, left, right = self.nodes[node]
+            if dim < 0:
+                rows = self.perm[start:stop]
+                d2 = ((self.points[rows] - q) ** 2).sum(axis=1)
+                for d, i in zip(d2.tolist(), self.ids[rows].tolist()):
+                    if not alive[i]:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d, i))
+                    elif d < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d, i))
+                return
+            diff = q[dim] - split
+            near, far = (left, right) if diff <= 0 else (right, left)
+            visit(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far)
+
+        if self.nodes:
+            visit(0)
+
+    def within(self, q: np.ndarray, r2: float, alive: np.ndarray) -> List[Tuple[float, int]]:
+        found = []
+
+        def visit(node):
+            start, stop, dim, split, left, right = self.nodes[node]
+            if dim < 0:
+                rows = self.perm[start:stop]
+                d2 = ((self.points[rows] - q) ** 2).sum(axis=1)
+                found.extend((d, i) for d, i in zip(d2.tolist(), self.ids[rows].tolist()) if d <= r2 and alive[i])
+                return
+            diff = q[dim] - split
+            if diff <= 0 or diff * diff <= r2:
+                visit(left)
+            if diff >= 0 or diff * diff <= r2:
+                visit(right)
+
+        if self.nodes:
+            visit(0)
+        return found
+
+
+class ScenarioIndex:
+    """
+    k-NN and range queries over scenarios, keyed by config file stem.
+
+    `add` re-scores a config (unless metrics are passed) and replaces any previous entry
+    with the same key. `interpolate` estimates metrics from the nearest neighbours by
+    inverse-distance weighting, for quick previews while exploring inputs.
+    """
+
+    def __init__(self, rebuild_threshold: int = 256):
+        self.rebuild_threshold = rebuild_threshold
+        self.keys: List[str] = []
+        self.mtimes: List[float] = []
+        self._raw = np.empty((0, len(FEATURES)))
+        self._metrics = np.empty((0, len(METRICS)))
+        self._alive = np.empty(0, dtype=bool)
+        self._slot: Dict[str, int] = {}
+        self._mean = np.zeros(len(FEATURES))
+        self._scale = np.ones(len(FEATURES))
+        self._tree = _KDTree(self._raw, np.empty(0, dtype=int))
+        self._pending: List[int] = []
+        # Reentrant: updates call each other (add -> _append -> rebuild).
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._slot)
+
+    # --- updates ---
+
+    def add_many(self, keys: Sequence[str], configs: Sequence[TEAConfig], mtimes: Optional[Sequence[float]] = None):
+        """Add or replace several scenarios, scoring them in one batch."""
+        if not keys:
+            return
+        inputs = BatchInputs.from_configs(configs)
+        results = evaluate_batch(inputs)
+        metrics = np.column_stack([results[m].astype(float) for m in METRICS])
+        with self._lock:
+            self._append(list(keys), feature_matrix(inputs), metrics,
+                         list(mtimes) if mtimes is not None else [0.0] * len(keys))
+
+    def add(self, key: str, config: TEAConfig, mtime: float = 0.0):
+        self.add_many([key], [config], [mtime])
+
+    def remove(self, key: str):
+        with self._lock:
+            slot = self._slot.pop(key, None)
+            if slot is not None:
+                self._alive[slot] = False
+
+    def _append(self, keys: List[str], raw: np.ndarray, metrics: np.ndarray, mtimes: List[float]):
+        for key in keys:
+            self.remove(key)
+        start = len(self.keys)
+        self.keys.extend(keys)
+        self.mtimes.extend(mtimes)
+        self._raw = np.vstack([self._raw, raw])
+        self._metrics = np.vstack([self._metrics, metrics])
+        self._alive = np.concatenate([self._alive, np.ones(len(keys), dtype=bool)])
+        for offset, key in enumerate(keys):
+            self._slot[key] = start + offset
+        self._pending.extend(range(start, start + len(keys)))
+        if len(self._pending) > self.rebuild_threshold or not self._tree.nodes:
+            self._rebuild()
+
+    def rebuild(self):
+        """Drop removed entries, re-standardize features and rebuild the tree."""
+        with self._lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        keep = np.flatnonzero(self._alive)
+        self.keys = [self.keys[i] for i in keep]
+        self.mtimes = [self.mtimes[i] for i in keep]
+        self._raw, self._metrics = self._raw[keep], self._metrics[keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._slot = {key: i for i, key in enumerate(self.keys)}
+        if len(keep):
+            self._mean = self._raw.mean(axis=0)
+            scale = self._raw.std(axis=0)
+            self._scale = np.where(scale > 0, scale, 1.0)
+        self._tree = _KDTree(self._normalize(self._raw), np.arange(len(keep)))
+        self._pending = []
+
+    # --- queries ---
+
+    def _normalize(self, raw: np.ndarray) -> np.ndarray:
+        return (raw - self._mean) / self._scale
+
+    def _query_point(self, config: TEAConfig) -> np.ndarray:
+        return self._normalize(feature_matrix(BatchInputs.from_configs([config])))[0]
+
+    def _result(self, d2: float, slot: int) -> Neighbour:
+        return self.keys[slot], float(np.sqrt(d2)), dict(zip(METRICS, self._metrics[slot].tolist()))
+
+    def query(self, config: TEAConfig, k: int = 5) -> List[Neighbour]:
+        """The `k` nearest scenarios as `(key, distance, metrics)`, closest first."""
+        if k <= 0:
+            return []
+        with self._lock:
+            return self._query(config, k)
+
+    def _query(self, config: TEAConfig, k: int) -> List[Neighbour]:
+        q = self._query_point(config)
+        heap = []
+        self._tree.knn(q, k, self._alive, heap)
+        if self._pending:
+            pending = np.array(self._pending)
+            d2 = ((self._normalize(self._raw[pending]) - q) ** 2).sum(axis=1)
+            for d, i in zip(d2.tolist(), pending.tolist()):
+                if not self._alive[i]:
+                    continue
+                if len(heap) < k:
+                    heapq.heappush(heap, (-d, i))
+                elif d < -heap[0][0]:
+                    heapq.heapreplace(heap, (-d, i))
+        return [self._result(-d, i) for d, i in sorted(heap, reverse=True)]
+
+    def query_radius(self, config: TEAConfig, radius: float) -> List[Neighbour]:
+        """All scenarios within `radius` (in standardized feature units), closest first."""
+        with self._lock:
+            return self._query_radius(config, radius)
+
+    def _query_radius(self, config: TEAConfig, radius: float) -> List[Neighbour]:
+        q = self._query_point(config)
+        found = self._tree.within(q, radius ** 2, self._alive)
+        if self._pending:
+            pending = np.array(self._pending)
+            d2 = ((self._normalize(self._raw[pending]) - q) ** 2).sum(axis=1)
+            found.extend((d, i) for d, i in zip(d2.tolist(), pending.tolist()) if d <= radius ** 2 and self._alive[i])
+        return [self._result(d, i) for d, i in sorted(found)]
+
+    def interpolate(self, config: TEAConfig, k: int = 5) -> Dict[str, float]:
+        """
+        Inverse-distance-weighted estimate of NPV and ROI from the `k` nearest scenarios.
+
+        `breakeven_year` is a year or -1 for "never", so it is not averaged; the nearest
+        scenario's value is returned instead.
+        """
+        neighbours = self.query(config, k)
+        if not neighbours:
+            return {m: float("nan") for m in METRICS}
+        distances = np.array([d for _, d, _ in neighbours])
+        if distances[0] == 0:
+            return dict(neighbours[0][2])
+        weights = 1 / distances ** 2
+        estimate = {}
+        for m in METRICS:
+            if m == "breakeven_year":
+                estimate[m] = neighbours[0][2][m]
+                continue
+            values = np.array([metrics[m] for _, _, metrics in neighbours])
+            finite = np.isfinite(values)
+            estimate[m] = float((weights[finite] * values[finite]).sum() / weights[finite].sum()) if finite.any() else float("inf")
+        return estimate
+
+    # --- persistence ---
+
+    def save(self, path: str):
+        # Written to a temporary file and renamed, so readers never see a partial index.
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._lock:
+            alive = np.flatnonzero(self._alive)
+            with open(tmp, "wb") as f:
+                np.savez(
+                    f,
+                    keys=np.array([self.keys[i] for i in alive], dtype=str),
+                    mtimes=np.array([self.mtimes[i] for i in alive], dtype=float),
+                    raw=self._raw[alive],
+                    metrics=self._metrics[alive],
+                )
+            os.replace(tmp, path)
+
+    @staticmethod
+    def load(path: str) -> "ScenarioIndex":
+        index = ScenarioIndex()
+        with np.load(path) as data:
+            index._append(data["keys"].tolist(), data["raw"], data["metrics"], data["mtimes"].tolist())
+        index.rebuild()
+        return index
+
+    def sync_directory(self, config_dir: str) -> int:
+        """Index new or modified `*.json` configs in `config_dir`, drop deleted ones; returns #changes."""
+        with self._lock:
+            return self._sync_directory(config_dir)
+
+    def _sync_directory(self, config_dir: str) -> int:
+        current = {}
+        for file in os.listdir(config_dir):
+            if file.endswith(".json"):
+                current[file[:-len(".json")]] = os.path.getmtime(os.path.join(config_dir, file))
+        stale = [key for key, mtime in current.items()
+                 if key not in self._slot or self.mtimes[self._slot[key]] < mtime]
+        removed = [key for key in self._slot if key not in current]
+        for key in removed:
+            self.remove(key)
+        configs = [TEAConfig.from_json(os.path.join(config_dir, f"{key}.json")) for key in stale]
+        self.add_many(stale, configs, [current[key] for key in stale])
+        return len(stale) + len(removed)
+
+
+def load_index(config_dir: str) -> ScenarioIndex:
+    """Load the index stored next to the configs (building it on first use) and bring it up to date."""
+    path = os.path.join(config_dir, INDEX_FILE)
+    index = ScenarioIndex.load(path) if os.path.exists(path) else ScenarioIndex()
+    if index.sync_directory(config_dir):
+        index.save(path)
+    return index
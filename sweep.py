@@ -0,0 +1,505 @@
+"""
+Sharded parameter sweeps over `Scenario` / `FinancialInputs` fields.
+
+A sweep is a full grid: every combination of the values listed per field, applied on
+top of a base `TEAConfig`. The grid is split into contiguous index ranges (shards).
+A `SweepCoordinator` hands shards to workers over a `multiprocessing.connection`
+socket and merges the partial top-k and aggregate results they stream back. Finished
+shards are appended to a checkpoint file, so a killed run resumes where it left off.
+
+Workers can be local processes (`run_sweep(..., workers=4)`) or run on other hosts
+against the same coordinator address. The connection uses pickle, so only expose it
+on trusted networks and always set an authkey:
+
+    python sweep.py coordinator --base configs/moderate.json --space space.json \\
+        --bind 0.0.0.0:6000 --authkey secret --checkpoint sweep.ckpt --local-workers 4
+    python sweep.py worker --connect coordinator-host:6000 --authkey secret
+"""
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from batch import BatchInputs, evaluate_batch
+from bundles import NUMERIC_FIELDS
+from calculations import expand_schedule
+from models import TEAConfig
+
+CHUNK_SIZE = 65_536
+GROWTH_FIELDS = ("subscriber_growth_rate", "opex_growth_rate")
+SCHEDULE_FIELDS = GROWTH_FIELDS + ("subscription_fee", "pay_per_use_fee", "capex")
+AGGREGATED_METRICS = ("npv", "roi")
+RANKED_METRICS = ("npv", "roi", "breakeven_year")
+# Largest grid accepted; flat indices must fit int64 with room to spare, and a larger
+# grid would take years to evaluate anyway.
+MAX_SWEEP_SIZE = 10 ** 12
+
+
+class SweepError(RuntimeError):
+    """Raised by `SweepCoordinator.serve` when a shard keeps failing on the workers."""
+
+
+def validate_space(space: Dict[str, Sequence[float]]):
+    """Raise `ValueError` unless every key of `space` is a config field with at least one value."""
+    if not space:
+        raise ValueError("A sweep needs at least one field to vary")
+    for name, values in space.items():
+        if name not in NUMERIC_FIELDS:
+            raise ValueError(f"Unknown sweep field '{name}' (expected one of {', '.join(NUMERIC_FIELDS)})")
+        if len(values) == 0:
+            raise ValueError(f"Sweep field '{name}' has no values")
+
+
+# --- Grid decoding and shard evaluation --------------------------------------
+
+def _shape(space: Dict[str, Sequence[float]]) -> Tuple[int, ...]:
+    return tuple(len(values) for values in space.values())
+
+
+def sweep_size(space: Dict[str, Sequence[float]]) -> int:
+    """Number of grid points in `space`; raises `ValueError` above `MAX_SWEEP_SIZE`."""
+    size = math.prod(_shape(space))
+    if size > MAX_SWEEP_SIZE:
+        raise ValueError(f"The grid has {size:,} combinations, more than the {MAX_SWEEP_SIZE:,} supported; "
+                         f"use fewer values per field or a sampled design")
+    return size
+
+
+def decode(space: Dict[str, Sequence[float]], indices: np.ndarray) -> Dict[str, np.ndarray]:
+    """Field values for flat grid `indices` (C order over the fields of `space`)."""
+    positions = np.unravel_index(indices, _shape(space))
+    return {name: np.asarray(values, dtype=float)[pos] for (name, values), pos in zip(space.items(), positions)}
+
+
+def grid_batch(base: TEAConfig, values: Dict[str, np.ndarray]) -> BatchInputs:
+    """A batch where the fields in `values` vary per row and all others come from `base`."""
+    unknown = [name for name in values if name not in NUMERIC_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown config field(s): {', '.join(unknown)}")
+    n = len(next(iter(values.values())))
+    flat = {**base.scenario.to_dict(), **base.financials.to_dict()}
+    years = values["years"].astype(int) if "years" in values else np.full(n, int(flat["years"]))
+    horizon = int(years.max(initial=1))
+    columns = {"years": years}
+    for name, value in flat.items():
+        if name in ("name", "years"):
+            continue
+        if name in values:
+            columns[name] = values[name]
+        elif name in SCHEDULE_FIELDS:
+            length = horizon - 1 if name in GROWTH_FIELDS else horizon
+            schedule = expand_schedule(value, length, fill=0.0 if name == "capex" else None)
+            columns[name] = np.broadcast_to(schedule, (n, length))
+        else:
+            columns[name] = np.full(n, float(value))
+    return BatchInputs.from_arrays(**columns)
+
+
+def empty_state() -> Dict[str, Any]:
+    stats = {"n": 0, "sum": 0.0, "sumsq": 0.0, "min": float("inf"), "max": float("-inf")}
+    return {"count": 0, "breakeven": {}, "top": [], **{m: dict(stats) for m in AGGREGATED_METRICS}}
+
+
+def _top(values: np.ndarray, indices: np.ndarray, k: int, largest: bool) -> List[List[float]]:
+    keys = -values if largest else values
+    # Ties are broken by grid index so results don't depend on how shards were split.
+    keep = np.flatnonzero(keys <= np.partition(keys, k - 1)[k - 1]) if len(keys) > k else np.arange(len(keys))
+    keep = keep[np.lexsort((indices[keep], keys[keep]))][:k]
+    return [[float(values[i]), int(indices[i])] for i in keep]
+
+
+def merge_states(a: Dict[str, Any], b: Dict[str, Any], k: int, largest: bool = True) -> Dict[str, Any]:
+    """Combine two partial results (aggregates are additive, top-k is re-selected)."""
+    merged = {"count": a["count"] + b["count"], "breakeven": dict(a["breakeven"])}
+    for year, count in b["breakeven"].items():
+        merged["breakeven"][year] = merged["breakeven"].get(year, 0) + count
+    for m in AGGREGATED_METRICS:
+        merged[m] = {
+            "n": a[m]["n"] + b[m]["n"],
+            "sum": a[m]["sum"] + b[m]["sum"],
+            "sumsq": a[m]["sumsq"] + b[m]["sumsq"],
+            "min": min(a[m]["min"], b[m]["min"]),
+            "max": max(a[m]["max"], b[m]["max"]),
+        }
+    top = a["top"] + b["top"]
+    if top:
+        values, indices = np.array([t[0] for t in top]), np.array([t[1] for t in top])
+        merged["top"] = _top(values, indices, k, largest)
+    else:
+        merged["top"] = []
+    return merged
+
+
+def evaluate_shard(spec: Dict[str, Any], start: int, stop: int) -> Dict[str, Any]:
+    """Evaluate grid indices `[start, stop)` of a sweep spec in memory-bounded chunks."""
+    base = TEAConfig.from_dict(spec["base"])
+    space, k, metric, largest = spec["space"], spec["top_k"], spec["metric"], spec["largest"]
+    state = empty_state()
+    for lo in range(start, stop, CHUNK_SIZE):
+        indices = np.arange(lo, min(lo + CHUNK_SIZE, stop), dtype=np.int64)
+        results = evaluate_batch(grid_batch(base, decode(space, indices)))
+        state = merge_states(state, chunk_state(results, indices, k, metric, largest), k, largest)
+    return state
+
+
+def chunk_state(results: Dict[str, np.ndarray], indices: np.ndarray, k: int, metric: str, largest: bool) -> Dict[str, Any]:
+    """Partial result (aggregates and top-k) of one evaluated chunk, for `merge_states`."""
+    ranked = results[metric]
+    if metric == "breakeven_year":
+        # -1 means break-even is never reached, which ranks after every year; summarize
+        # turns it back into -1.
+        ranked = np.where(ranked == -1, np.inf, ranked)
+    chunk = {"count": len(indices), "top": _top(ranked, indices, k, largest)}
+    for m in AGGREGATED_METRICS:
+        finite = results[m][np.isfinite(results[m])]
+        chunk[m] = {
+            "n": len(finite),
+            "sum": float(finite.sum()),
+            "sumsq": float((finite ** 2).sum()),
+            "min": float(finite.min(initial=np.inf)),
+            "max": float(finite.max(initial=-np.inf)),
+        }
+    years, counts = np.unique(results["breakeven_year"], return_counts=True)
+    chunk["breakeven"] = {str(y): int(c) for y, c in zip(years, counts)}
+    return chunk
+
+
+def summarize(spec: Dict[str, Any], state: Dict[str, Any],
+              values: Optional[Callable[[np.ndarray], Dict[str, np.ndarray]]] = None) -> Dict[str, Any]:
+    """
+    Readable summary of a merged state: metric statistics and decoded top-k rows.
+
+    `values` maps top-k indices to field values (default: decode `spec["space"]`).
+    """
+    summary = {"evaluated": state["count"], "breakeven_years": state["breakeven"]}
+    for m in AGGREGATED_METRICS:
+        s = state[m]
+        mean = s["sum"] / s["n"] if s["n"] else float("nan")
+        var = s["sumsq"] / s["n"] - mean ** 2 if s["n"] else float("nan")
+        summary[m] = {
+            "count": s["n"],
+            "mean": mean,
+            "std": float(np.sqrt(max(var, 0.0))) if s["n"] else float("nan"),
+            "min": s["min"] if s["n"] else float("nan"),
+            "max": s["max"] if s["n"] else float("nan"),
+        }
+    if state["top"]:
+        indices = np.array([t[1] for t in state["top"]], dtype=np.int64)
+        params = values(indices) if values else decode(spec["space"], indices)
+        never = spec["metric"] == "breakeven_year"
+        summary["top"] = [
+            {"index": int(i), spec["metric"]: -1.0 if never and value == float("inf") else value,
+             **{name: float(params[name][row]) for name in params}}
+            for row, (value, i) in enumerate(state["top"])
+        ]
+    else:
+        summary["top"] = []
+    return summary
+
+
+# --- Coordinator ---------------------------------------------------------------
+
+class SweepCoordinator:
+    """
+    Serves the shards of one sweep to any number of connected workers.
+
+    Results are merged as they arrive; `on_progress(done, total, state)` is called after
+    each shard. With a `checkpoint` path, every finished shard is appended to that file
+    and skipped when the same sweep is started again. A shard that fails (an exception
+    on the worker, or the worker dying) is retried up to `max_failures - 1` times; after
+    that the sweep fails with `SweepError`.
+    """
+
+    def __init__(self,
+                 base: TEAConfig,
+                 space: Dict[str, Sequence[float]],
+                 shard_size: int = 1_000_000,
+                 top_k: int = 10,
+                 metric: str = "npv",
+                 largest: bool = True,
+                 checkpoint: Optional[str] = None,
+                 address: Tuple[str, int] = ("127.0.0.1", 0),
+                 authkey: Optional[bytes] = None,
+                 max_failures: int = 3):
+        validate_space(space)
+        if metric not in RANKED_METRICS:
+            raise ValueError(f"Unknown sweep metric '{metric}' (expected one of {', '.join(RANKED_METRICS)})")
+        self.spec = {
+            "base": base.to_dict(),
+            "space": {name: [float(v) for v in values] for name, values in space.items()},
+            "top_k": top_k,
+            "metric": metric,
+            "largest": largest,
+        }
+        size = sweep_size(space)
+        self.shards = [(start, min(start + shard_size, size)) for start in range(0, size, shard_size)]
+        self.fingerprint = hashlib.sha256(json.dumps([self.spec, shard_size], sort_keys=True).encode()).hexdigest()
+        self.checkpoint = checkpoint
+        self.authkey = authkey or secrets.token_bytes(16)
+        self.state = empty_state()
+        self.done = set()
+        self._pending = []
+        self._in_flight = set()
+        self.max_failures = max_failures
+        self._failures: Dict[int, int] = {}
+        self.error: Optional[str] = None
+        self._lock = threading.Condition()
+        self._on_progress = None
+        self._load_checkpoint()
+        self._pending = [i for i in range(len(self.shards)) if i not in self.done]
+        self._listener = Listener(address, authkey=self.authkey)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._listener.address
+
+    @property
+    def finished(self) -> bool:
+        return len(self.done) == len(self.shards)
+
+    def _load_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return
+        with open(self.checkpoint, "rb+") as f:
+            first = f.readline()
+            if not first.endswith(b"\n"):
+                # Killed before the header was complete: start the file over.
+                f.truncate(0)
+                return
+            if json.loads(first).get("sweep") != self.fingerprint:
+                raise ValueError(f"Checkpoint '{self.checkpoint}' belongs to a different sweep")
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith(b"\n"):
+                    # Partially written last line of a killed run: drop it, so the next
+                    # entry starts on a line of its own.
+                    f.truncate(offset)
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry["shard"] not in self.done:
+                    self.done.add(entry["shard"])
+                    self.state = merge_states(self.state, entry["state"], self.spec["top_k"], self.spec["largest"])
+
+    def _record(self, shard: int, state: Dict[str, Any]):
+        if not self.checkpoint:
+            return
+        new = not os.path.exists(self.checkpoint) or os.path.getsize(self.checkpoint) == 0
+        with open(self.checkpoint, "a") as f:
+            if new:
+                f.write(json.dumps({"sweep": self.fingerprint, "shards": len(self.shards)}) + "\n")
+            f.write(json.dumps({"shard": shard, "state": state}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _next_shard(self) -> Optional[int]:
+        with self._lock:
+            if self._pending:
+                shard = self._pending.pop(0)
+                self._in_flight.add(shard)
+                return shard
+            return None
+
+    def _handle(self, conn):
+        shard = None
+        try:
+            conn.send(("spec", self.spec))
+            while True:
+                message = conn.recv()
+                if message[0] == "result":
+                    _, shard_id, state = message
+                    with self._lock:
+                        self._in_flight.discard(shard_id)
+                        if shard_id not in self.done:
+                            self.done.add(shard_id)
+                            self.state = merge_states(self.state, state, self.spec["top_k"], self.spec["largest"])
+                            self._record(shard_id, state)
+                            if self._on_progress:
+                                self._on_progress(len(self.done), len(self.shards), self.state)
+                        self._lock.notify_all()
+                    shard = None
+                elif message[0] == "error":
+                    _, shard_id, details = message
+                    self._fail(shard_id, details)
+                    shard = None
+                shard = None if self.error else self._next_shard()
+                if shard is not None:
+                    conn.send(("shard", shard, *self.shards[shard]))
+                elif self.finished or self.error:
+                    conn.send(("done",))
+                    return
+                else:
+                    conn.send(("wait", 0.5))
+        except (EOFError, OSError):
+            pass
+        finally:
+            if shard is not None:
+                # The worker went away mid-shard: hand the shard to someone else.
+                self._fail(shard, "worker disconnected while evaluating the shard")
+            conn.close()
+
+    def _fail(self, shard: int, details: str):
+        with self._lock:
+            self._in_flight.discard(shard)
+            if shard in self.done:
+                return
+            self._failures[shard] = self._failures.get(shard, 0) + 1
+            if self._failures[shard] >= self.max_failures:
+                start, stop = self.shards[shard]
+                self.error = f"Shard {shard} (grid indices {start}-{stop}) failed {self._failures[shard]} times:\n{details}"
+            else:
+                self._pending.insert(0, shard)
+            self._lock.notify_all()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                return
+            except Exception:
+                continue  # failed handshake, e.g. wrong authkey
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def serve(self, on_progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Block until every shard is done and return the summary (see `summarize`)."""
+        self._on_progress = on_progress
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        with self._lock:
+            while not self.finished and not self.error:
+                self._lock.wait(timeout=1.0)
+        # Give connected workers a moment to receive their "done" message.
+        time.sleep(0.1)
+        self._listener.close()
+        if self.error:
+            raise SweepError(self.error)
+        return summarize(self.spec, self.state)
+
+
+# --- Workers -------------------------------------------------------------------
+
+def run_worker(address: Tuple[str, int], authkey: bytes, retries: int = 10):
+    """Connect to a coordinator and evaluate shards until it reports the sweep done."""
+    for attempt in range(retries):
+        try:
+            conn = Client(tuple(address), authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            time.sleep(min(2 ** attempt * 0.1, 5.0))
+    else:
+        raise ConnectionRefusedError(f"No sweep coordinator at {address}")
+
+    with conn:
+        _, spec = conn.recv()
+        conn.send(("ready",))
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            if message[0] == "done":
+                return
+            if message[0] == "wait":
+                time.sleep(message[1])
+                conn.send(("ready",))
+                continue
+            _, shard, start, stop = message
+            try:
+                state = evaluate_shard(spec, start, stop)
+            except Exception:
+                conn.send(("error", shard, traceback.format_exc()))
+                continue
+            conn.send(("result", shard, state))
+
+
+def run_sweep(base: TEAConfig,
+              space: Dict[str, Sequence[float]],
+              workers: int = os.cpu_count() or 1,
+              on_progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+              **kwargs) -> Dict[str, Any]:
+    """Run a sweep with `workers` local worker processes (extra kwargs go to `SweepCoordinator`)."""
+    coordinator = SweepCoordinator(base, space, **kwargs)
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=run_worker, args=(coordinator.address, coordinator.authkey), daemon=True)
+                 for _ in range(workers if not coordinator.finished else 0)]
+    for p in processes:
+        p.start()
+    try:
+        return coordinator.serve(on_progress)
+    finally:
+        for p in processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+
+
+def _host_port(value: str) -> Tuple[str, int]:
+    host, port = value.rsplit(":", 1)
+    return host, int(port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sharded TEA parameter sweeps.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    coord = sub.add_parser("coordinator", help="Serve a sweep to workers")
+    coord.add_argument("--base", required=True, help="Base config JSON")
+    coord.add_argument("--space", required=True, help='JSON file mapping fields to value lists, e.g. {"subscription_fee": [1000, 2000]}')
+    coord.add_argument("--bind", default="127.0.0.1:6000")
+    coord.add_argument("--authkey", default=os.environ.get("TEA_SWEEP_AUTHKEY"))
+    coord.add_argument("--checkpoint")
+    coord.add_argument("--shard-size", type=int, default=1_000_000)
+    coord.add_argument("--top-k", type=int, default=10)
+    coord.add_argument("--metric", default="npv")
+    coord.add_argument("--smallest", action="store_true", help="Rank the smallest metric values first")
+    coord.add_argument("--local-workers", type=int, default=0)
+    coord.add_argument("--output", help="Write the summary JSON here")
+
+    work = sub.add_parser("worker", help="Evaluate shards for a coordinator")
+    work.add_argument("--connect", required=True)
+    work.add_argument("--authkey", default=os.environ.get("TEA_SWEEP_AUTHKEY"))
+
+    args = parser.parse_args()
+    if not args.authkey:
+        parser.error("an authkey is required (--authkey or TEA_SWEEP_AUTHKEY)")
+    authkey = args.authkey.encode()
+
+    if args.command == "worker":
+        run_worker(_host_port(args.connect), authkey)
+    else:
+        with open(args.space, "r") as f:
+            space = json.load(f)
+        coordinator = SweepCoordinator(
+            TEAConfig.from_json(args.base), space,
+            shard_size=args.shard_size, top_k=args.top_k, metric=args.metric, largest=not args.smallest,
+            checkpoint=args.checkpoint, address=_host_port(args.bind), authkey=authkey,
+        )
+        print(f"🧮 Serving {sweep_size(space):,} combinations in {len(coordinator.shards)} shards "
+              f"on {coordinator.address[0]}:{coordinator.address[1]} ({len(coordinator.done)} already done)")
+        ctx = multiprocessing.get_context("spawn")
+        for _ in range(args.local_workers):
+            ctx.Process(target=run_worker, args=(coordinator.address, authkey), daemon=True).start()
+        try:
+            summary = coordinator.serve(lambda done, total, _: print(f"  {done}/{total} shards done", flush=True))
+        except SweepError as e:
+            parser.exit(1, f"❌ Sweep failed: {e}\n")
+        output = json.dumps(summary, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output)
+        print(output)
@@ -1,45 +1,265 @@
-import json
-import pandas as pd
+"""
+Golden-data regression harness for the TEA engine.
+
+Evaluates every config in `configs/` in one batch per engine backend and compares all
+per-year series and metrics with vectorized tolerance checks against:
+
+- `validation/golden_results.csv`: reference series and metrics per config
+  (regenerate from the iterative engine with `--update-golden` after an intended change),
+- `validation/Scenario_Comparison_Table.csv`: the documented inputs of the named scenarios,
+- optionally the validation workbook (`--workbook validation_scenario.xlsx`).
+
+Every mismatch is listed in a per-field diff report; the exit code is 1 if any check fails.
+
+    python validate_results.py
+    python validate_results.py --backend batch --report diffs.csv
+"""
+import argparse
 import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from batch import BatchInputs, evaluate_batch
+from calculations import Scenario, FinancialInputs, TEACalculator
+from models import TEAConfig
+
+CONFIG_DIR = "configs"
+GOLDEN_PATH = os.path.join("validation", "golden_results.csv")
+INPUTS_TABLE_PATH = os.path.join("validation", "Scenario_Comparison_Table.csv")
+WORKBOOK_CONFIG = "validation_scenario"
+
+SERIES_FIELDS = ("subscribers", "subscription_revenue", "pay_per_use_revenue", "revenues", "opex",
+                 "capex", "profit", "cum_cash_flow", "reverse_fee")
+METRIC_FIELDS = ("npv", "roi", "breakeven_year")
+BACKENDS = ("iterative", "batch", "closed_form")
+
+# Absolute tolerance in € / subscribers, relative tolerance for large values.
+ATOL = 1e-2
+RTOL = 1e-9
+
+# Rows of the comparison table -> (config field, scale applied to the table value).
+INPUTS_TABLE_FIELDS = {
+    "Initial Subscribers": ("starting_subscribers", 1.0),
+    "Annual Subscriber Growth Rate": ("subscriber_growth_rate", 1.0),
+    "Subscription Fee per User": ("subscription_fee", 1.0),
+    "Pay-per-Use Fee per User": ("pay_per_use_fee", 1.0),
+    "Annual OPEX Growth Rate": ("opex_growth_rate", 1.0),
+    "Discount Rate": ("discount_rate", 1.0),
+    "Subscription Ratio": ("subscription_ratio", 0.01),
+    "Years": ("years", 1.0),
+    "Base OPEX (€)": ("base_opex", 1.0),
+    "CAPEX (€)": ("capex", 1.0),
+}
+
+# Columns of the comparison table -> config file stem.
+INPUTS_TABLE_CONFIGS = {"Conservative": "conservative", "Moderate": "moderate", "Aggressive": "aggresive"}
+
+# Workbook columns -> engine series.
+WORKBOOK_COLUMNS = {
+    "Subscribers": "subscribers",
+    "Subscription Revenue (€)": "subscription_revenue",
+    "Pay-Per-Use Revenue (€)": "pay_per_use_revenue",
+    "Total Revenue (€)": "revenues",
+    "OPEX (€)": "opex",
+    "Profit (€)": "profit",
+    "Cumulative Cash Flow (€)": "cum_cash_flow",
+}
+
+DIFF_COLUMNS = ["check", "scenario", "field", "year", "expected", "actual"]
+
+
+def load_configs(config_dir: str = CONFIG_DIR) -> Tuple[List[str], List[TEAConfig]]:
+    files = sorted(f for f in os.listdir(config_dir) if f.endswith(".json"))
+    return [f[:-len(".json")] for f in files], [TEAConfig.from_json(os.path.join(config_dir, f)) for f in files]
 
-# --- Load reference CSV ---
-csv_path = "./scenario_metrics_summary.csv"
-reference_df = pd.read_csv(csv_path)
 
-# --- Load JSON exports (your tool's outputs) ---
-results_dir = "configs"
-json_files = [f for f in os.listdir(results_dir) if f.endswith(".json")]
+# --- Backends ------------------------------------------------------------------
 
-# --- Tolerance for floating point comparison ---
-TOL = 1e-2
+def _evaluate_iterative(configs: Sequence[TEAConfig], horizon: int) -> Dict[str, np.ndarray]:
+    n = len(configs)
+    results = {name: np.full((n, horizon), np.nan) for name in SERIES_FIELDS}
+    results.update({name: np.zeros(n) for name in METRIC_FIELDS})
+    for i, config in enumerate(configs):
+        calc = TEACalculator(Scenario(**config.scenario.to_dict()), FinancialInputs(**config.financials.to_dict()))
+        years = config.financials.years
+        subscribers = calc.project_subscribers()
+        opex = calc.project_opex()
+        sub_rev, ppu_rev = calc.project_revenue_breakdown()
+        series = {
+            "subscribers": subscribers,
+            "subscription_revenue": sub_rev,
+            "pay_per_use_revenue": ppu_rev,
+            "revenues": calc.project_revenue(),
+            "opex": opex,
+            "capex": calc.project_capex(),
+            "profit": calc.calculate_profit(),
+            "cum_cash_flow": calc.calculate_cumulative_cash_flow(),
+            "reverse_fee": [o / max(s, 1) for o, s in zip(opex, subscribers)],
+        }
+        for name, values in series.items():
+            results[name][i, :years] = values
+        results["npv"][i] = calc.calculate_npv()
+        results["roi"][i] = calc.calculate_roi()
+        results["breakeven_year"][i] = calc.calculate_breakeven_year()
+    return results
 
-# --- Validate each scenario ---
-for file in json_files:
-    with open(os.path.join(results_dir, file)) as f:
-        tool_output = json.load(f)
-    
-    name = file.replace(".json", "")
-    print(f"🔍 Validating {name}...")
 
-    if name not in reference_df["Scenario"].values:
-        print(f"⚠️ Scenario '{name}' not found in CSV.")
-        continue
+def evaluate(backend: str, configs: Sequence[TEAConfig], inputs: Optional[BatchInputs] = None) -> Dict[str, np.ndarray]:
+    """Series `(n, T)` and metrics `(n,)` for all configs from one engine backend."""
+    inputs = inputs or BatchInputs.from_configs(configs)
+    if backend == "iterative":
+        return _evaluate_iterative(configs, inputs.horizon)
+    if backend == "batch":
+        return evaluate_batch(inputs)
+    if backend == "closed_form":
+        return evaluate_batch(inputs, method="closed_form")
+    raise ValueError(f"Unknown backend '{backend}' (expected one of {', '.join(BACKENDS)})")
 
-    ref_row = reference_df[reference_df["Scenario"] == name].iloc[0]
 
-    # Example metrics
-    for field in ["NPV (€)", "ROI", "Break-even Year"]:
-        tool_value = tool_output.get("metrics", {}).get(field)
-        expected = ref_row[field]
+# --- Comparison ----------------------------------------------------------------
 
-        if pd.isna(expected):
-            print(f"  ⚠️ {field}: Expected value missing.")
+def compare(check: str, names: Sequence[str], expected: Dict[str, np.ndarray], actual: Dict[str, np.ndarray],
+            fields: Sequence[str]) -> pd.DataFrame:
+    """One row per value outside tolerance; NaN must match NaN (e.g. past a horizon)."""
+    frames = []
+    for field in fields:
+        e, a = np.asarray(expected[field], dtype=float), np.asarray(actual[field], dtype=float)
+        width = min(e.shape[-1], a.shape[-1]) if e.ndim == 2 else None
+        if width is not None:
+            e, a = e[:, :width], a[:, :width]
+        bad = ~np.isclose(a, e, rtol=RTOL, atol=ATOL, equal_nan=True)
+        if not bad.any():
             continue
+        rows = np.nonzero(bad)
+        frames.append(pd.DataFrame({
+            "check": check,
+            "scenario": np.asarray(names)[rows[0]],
+            "field": field,
+            "year": rows[1] + 1 if e.ndim == 2 else 0,
+            "expected": e[rows],
+            "actual": a[rows],
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=DIFF_COLUMNS)
 
-        # Compare with tolerance for floats
-        if abs(float(tool_value) - float(expected)) > TOL:
-            print(f"  ❌ {field} mismatch: Expected {expected}, got {tool_value}")
+
+def golden_frame(names: Sequence[str], results: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Long format: scenario, field, year (0 for metrics), value."""
+    frames = []
+    for field in SERIES_FIELDS:
+        values = results[field]
+        rows, cols = np.nonzero(~np.isnan(values))
+        frames.append(pd.DataFrame({"scenario": np.asarray(names)[rows], "field": field, "year": cols + 1, "value": values[rows, cols]}))
+    for field in METRIC_FIELDS:
+        frames.append(pd.DataFrame({"scenario": names, "field": field, "year": 0, "value": results[field]}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def golden_arrays(golden: pd.DataFrame, names: Sequence[str], horizon: int) -> Tuple[Dict[str, np.ndarray], List[str]]:
+    """Scatter a golden frame into arrays aligned with `names`; also returns configs without golden data."""
+    row_of = pd.Series(np.arange(len(names)), index=list(names))
+    golden = golden[golden["scenario"].isin(row_of.index)]
+    rows = row_of[golden["scenario"]].to_numpy()
+    arrays = {}
+    for field in SERIES_FIELDS + METRIC_FIELDS:
+        mask = (golden["field"] == field).to_numpy()
+        if field in METRIC_FIELDS:
+            arrays[field] = np.full(len(names), np.nan)
+            arrays[field][rows[mask]] = golden["value"].to_numpy()[mask]
         else:
-            print(f"  ✅ {field} OK")
+            arrays[field] = np.full((len(names), horizon), np.nan)
+            years = golden["year"].to_numpy()[mask] - 1
+            keep = years < horizon
+            arrays[field][rows[mask][keep], years[keep]] = golden["value"].to_numpy()[mask][keep]
+    missing = sorted(set(names) - set(golden["scenario"]))
+    return arrays, missing
+
+
+def _parse_table_value(text: str) -> float:
+    return float(str(text).replace("€", "").replace(",", "").replace("%", "").strip())
+
+
+def check_inputs_table(names: Sequence[str], inputs: BatchInputs, path: str = INPUTS_TABLE_PATH) -> pd.DataFrame:
+    """Compare the documented scenario inputs with the configs listed in `INPUTS_TABLE_CONFIGS`."""
+    table = pd.read_csv(path).set_index("Parameter")
+    row_of = {name: i for i, name in enumerate(names)}
+    columns = [c for c in table.columns if INPUTS_TABLE_CONFIGS.get(c) in row_of]
+    rows = np.array([row_of[INPUTS_TABLE_CONFIGS[c]] for c in columns], dtype=int)
+    expected, actual = {}, {}
+    for parameter, (field, scale) in INPUTS_TABLE_FIELDS.items():
+        expected[field] = table.loc[parameter, columns].map(_parse_table_value).to_numpy() * scale
+        values = getattr(inputs, field)
+        actual[field] = (values[:, 0] if values.ndim == 2 else values)[rows]
+    fields = [field for field, _ in INPUTS_TABLE_FIELDS.values()]
+    return compare("inputs_table", np.asarray(names)[rows], expected, actual, fields)
+
+
+def check_workbook(path: str, names: Sequence[str], results: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Compare the per-year columns of the validation workbook with the `validation_scenario` config."""
+    workbook = pd.read_excel(path)
+    row = list(names).index(WORKBOOK_CONFIG)
+    years = len(workbook)
+    expected = {field: workbook[column].to_numpy(dtype=float)[None, :] for column, field in WORKBOOK_COLUMNS.items() if column in workbook}
+    actual = {field: results[field][row:row + 1, :years] for field in expected}
+    return compare("workbook", [WORKBOOK_CONFIG], expected, actual, list(expected))
+
+
+def run(backends: Sequence[str] = BACKENDS,
+        config_dir: str = CONFIG_DIR,
+        golden_path: str = GOLDEN_PATH,
+        workbook: Optional[str] = None) -> Tuple[pd.DataFrame, List[str]]:
+    """Run every check; returns the diff report and the configs that have no golden data yet."""
+    names, configs = load_configs(config_dir)
+    inputs = BatchInputs.from_configs(configs)
+    golden, missing = golden_arrays(pd.read_csv(golden_path), names, inputs.horizon)
+    known = np.isin(names, missing, invert=True)
+
+    reports = [check_inputs_table(names, inputs)]
+    for backend in backends:
+        results = evaluate(backend, configs, inputs)
+        subset = {k: v[known] for k, v in results.items() if k in SERIES_FIELDS + METRIC_FIELDS}
+        expected = {k: v[known] for k, v in golden.items()}
+        reports.append(compare(backend, np.asarray(names)[known], expected, subset, SERIES_FIELDS + METRIC_FIELDS))
+        if workbook and backend == backends[0]:
+            reports.append(check_workbook(workbook, names, results))
+    reports = [r for r in reports if not r.empty]
+    report = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=DIFF_COLUMNS)
+    return report, missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regression-check the TEA engine against golden data.")
+    parser.add_argument("--backend", choices=BACKENDS + ("all",), default="all")
+    parser.add_argument("--config-dir", default=CONFIG_DIR)
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--workbook", help="Validation workbook (.xlsx) with per-year columns for the validation scenario")
+    parser.add_argument("--report", help="Write the per-field diff report to this CSV")
+    parser.add_argument("--update-golden", action="store_true", help="Regenerate golden data from the iterative engine")
+    args = parser.parse_args()
+
+    if args.update_golden:
+        names, configs = load_configs(args.config_dir)
+        golden_frame(names, evaluate("iterative", configs)).to_csv(args.golden, index=False)
+        print(f"✅ Wrote golden data for {len(names)} configs to {args.golden}")
+        sys.exit(0)
+
+    backends = BACKENDS if args.backend == "all" else (args.backend,)
+    start = time.perf_counter()
+    report, missing = run(backends, args.config_dir, args.golden, args.workbook)
+    elapsed = time.perf_counter() - start
+
+    for name in missing:
+        print(f"⚠️ No golden data for '{name}' (run with --update-golden if it is a new scenario).")
+    if args.report:
+        report.to_csv(args.report, index=False)
+    if report.empty:
+        print(f"✅ All checks passed for backends: {', '.join(backends)} ({elapsed * 1000:.0f} ms)")
+        sys.exit(0)
 
-print("✅ Validation complete.")
+    print(report.groupby(["check", "field"]).size().rename("mismatches").to_string())
+    print(report.head(20).to_string(index=False))
+    print(f"❌ {len(report)} mismatches ({elapsed * 1000:.0f} ms)")
+    sys.exit(1)